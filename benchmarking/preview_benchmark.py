@@ -13,31 +13,20 @@ Usage:
 import os
 import sys
 import time
-import shutil
 import argparse
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Allow imports from project root
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import config
+from helpers import probe
 from helpers.vaapi_utils import vaapi_available
 
 
 def get_video_duration(input_file):
-    result = subprocess.run([
-        config.ffprobe, '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        input_file
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        return float(result.stdout.strip())
-    except (ValueError, TypeError):
-        stderr = result.stderr.decode('utf-8', errors='replace').strip()
-        raise RuntimeError(f"Could not determine duration for {input_file}: {stderr}")
+    return probe.get_video_duration(input_file, config.ffprobe)
 
 
 def get_start_times(duration, num_clips, clip_length, skip_seconds):
@@ -50,134 +39,54 @@ def get_start_times(duration, num_clips, clip_length, skip_seconds):
     return [skip_seconds + interval * i for i in range(1, num_clips + 1)]
 
 
-def extract_clip(ffmpeg, input_file, clip_file, start_time, clip_length, encoder, vaapi_device, verbose):
+def build_command(ffmpeg, input_file, output_file, start_times, clip_length, encoder, vaapi_device):
+    """Cut and join every clip in one ffmpeg pass — mirrors PreviewVideoGenerator.build_command()"""
+    command = [ffmpeg]
     if encoder == 'vaapi':
-        command = [
-            ffmpeg,
-            '-vaapi_device', vaapi_device,
-            '-ss', str(start_time),
-            '-i', input_file,
-            '-t', str(clip_length),
-            '-vf', 'format=nv12,hwupload,scale_vaapi=640:360',
-            '-c:v', 'h264_vaapi',
-            '-global_quality', '18',
-            '-an', '-y', '-loglevel', 'quiet',
-            clip_file
-        ]
-    elif encoder == 'nvenc':
-        command = [
-            ffmpeg,
-            '-ss', str(start_time),
-            '-i', input_file,
-            '-t', str(clip_length),
-            '-s', '640x360',
-            '-c:v', 'h264_nvenc',
-            '-cq:v', '18',
-            '-preset', 'p4',
-            '-an', '-y', '-loglevel', 'quiet',
-            clip_file
-        ]
-    else:
-        command = [
-            ffmpeg,
-            '-ss', str(start_time),
-            '-i', input_file,
-            '-t', str(clip_length),
-            '-s', '640x360',
-            '-c:v', 'libx264',
-            '-crf', '18',
-            '-preset', 'slow',
-            '-an', '-y', '-loglevel', 'quiet',
-            clip_file
-        ]
-    if verbose:
-        print(f"  clip: {' '.join(command)}")
-    subprocess.run(command, check=True)
-    return clip_file
+        command.extend(['-vaapi_device', vaapi_device])
+    for start_time in start_times:
+        command.extend(['-ss', str(start_time), '-t', str(clip_length), '-i', input_file])
 
+    filters = [f"[{i}:v:0]setpts=PTS-STARTPTS[v{i}]" for i in range(len(start_times))]
+    concat_inputs = ''.join(f"[v{i}]" for i in range(len(start_times)))
+    filters.append(f"{concat_inputs}concat=n={len(start_times)}:v=1:a=0[cv]")
 
-def concatenate_clips(ffmpeg, clip_files, concat_list, output_file, encoder, vaapi_device, verbose):
-    with open(concat_list, 'w') as f:
-        for clip in sorted(clip_files):
-            safe_path = os.path.normpath(clip).replace("\\", "/")
-            f.write(f"file '{safe_path}'\n")
-
-    command = [ffmpeg]
     if encoder == 'vaapi':
-        command.extend([
-            '-f', 'concat', '-safe', '0', '-i', concat_list,
-            '-vaapi_device', vaapi_device,
-            '-vf', 'format=nv12,hwupload,scale_vaapi=640:360',
-            '-c:v', 'h264_vaapi',
-            '-global_quality', '18',
-            '-an', '-y', '-loglevel', 'quiet',
-            output_file
-        ])
+        filters.append('[cv]format=nv12,hwupload,scale_vaapi=640:360[out_v]')
+        video_args = ['-c:v', 'h264_vaapi', '-global_quality', '18']
     elif encoder == 'nvenc':
-        command.extend([
-            '-f', 'concat', '-safe', '0', '-i', concat_list,
-            '-vf', 'scale=640:360',
-            '-c:v', 'h264_nvenc',
-            '-cq:v', '18',
-            '-preset', 'p4',
-            '-an', '-y', '-loglevel', 'quiet',
-            output_file
-        ])
+        filters.append('[cv]scale=640:360[out_v]')
+        video_args = ['-c:v', 'h264_nvenc', '-cq:v', '18', '-preset', 'p4']
     else:
-        command.extend([
-            '-f', 'concat', '-safe', '0', '-i', concat_list,
-            '-vf', 'scale=640:360',
-            '-c:v', 'libx264',
-            '-crf', '18',
-            '-preset', 'slow',
-            '-an', '-y', '-loglevel', 'quiet',
-            output_file
-        ])
-    if verbose:
-        print(f"  concat: {' '.join(command)}")
-    subprocess.run(command, check=True)
+        filters.append('[cv]scale=640:360[out_v]')
+        video_args = ['-c:v', 'libx264', '-crf', '18', '-preset', 'slow']
+
+    command.extend(['-filter_complex', ';'.join(filters), '-map', '[out_v]'])
+    command.extend(video_args)
+    command.extend(['-an', '-y', '-loglevel', 'quiet', output_file])
+    return command
 
 
 def run_benchmark(input_file, output_file, encoder, vaapi_device, num_clips, clip_length, skip_seconds, verbose):
     label = {'vaapi': 'VAAPI', 'nvenc': 'NVENC', 'software': 'Software'}.get(encoder, encoder)
     print(f"\n[{label}] Starting preview generation...")
 
-    temp_dir = os.path.join(os.getcwd(), ".tmp", f"bench_preview_{encoder}")
-    os.makedirs(temp_dir, exist_ok=True)
-
-    try:
-        duration = get_video_duration(input_file)
-        start_times = get_start_times(duration, num_clips, clip_length, skip_seconds)
-
-        t_clips_start = time.time()
-        clip_files = []
-
-        def _extract(args):
-            i, start = args
-            clip_file = os.path.join(temp_dir, f"clip_{i:03d}.mp4")
-            return extract_clip(config.ffmpeg, input_file, clip_file, start, clip_length,
-                                encoder, vaapi_device, verbose)
-
-        with ThreadPoolExecutor(max_workers=config.max_workers) as executor:
-            clip_files = list(executor.map(_extract, enumerate(start_times)))
+    duration = get_video_duration(input_file)
+    start_times = get_start_times(duration, num_clips, clip_length, skip_seconds)
 
-        t_clips_elapsed = time.time() - t_clips_start
-        print(f"  Clip extraction ({num_clips} clips): {t_clips_elapsed:.2f}s")
-
-        concat_list = os.path.join(temp_dir, "clips.txt")
-        t_concat_start = time.time()
-        concatenate_clips(config.ffmpeg, clip_files, concat_list, output_file,
-                          encoder, vaapi_device, verbose)
-        t_concat_elapsed = time.time() - t_concat_start
-        print(f"  Concatenation: {t_concat_elapsed:.2f}s")
+    command = build_command(config.ffmpeg, input_file, output_file, start_times, clip_length,
+                            encoder, vaapi_device)
+    if verbose:
+        print(f"  preview: {' '.join(command)}")
 
-        total = t_clips_elapsed + t_concat_elapsed
-        size_mb = os.path.getsize(output_file) / (1024 * 1024) if os.path.exists(output_file) else 0
-        print(f"  Total: {total:.2f}s  |  Output: {size_mb:.1f} MB → {output_file}")
-        return total
+    t_start = time.time()
+    subprocess.run(command, check=True)
+    total = time.time() - t_start
+    print(f"  Clip extraction + concatenation ({num_clips} clips, single pass): {total:.2f}s")
 
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+    size_mb = os.path.getsize(output_file) / (1024 * 1024) if os.path.exists(output_file) else 0
+    print(f"  Total: {total:.2f}s  |  Output: {size_mb:.1f} MB → {output_file}")
+    return total
 
 
 def resolve_encoder(vaapi_ok, vaapi_device, use_vaapi_flag, no_vaapi_flag, nvenc_flag, hw_priority):
@@ -233,8 +142,6 @@ def main():
         print(f"Input file not found: {args.input}")
         sys.exit(1)
 
-    os.makedirs(os.path.join(os.getcwd(), ".tmp"), exist_ok=True)
-
     vaapi_ok, vaapi_device = vaapi_available() if not config.windows else (False, None)
     hw_priority = args.hw_priority or config.hw_priority
 
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 """
 Sprite Benchmark
-Benchmarks sprite sheet generation using the same pipeline as VideoSpriteGenerator.
-Supports VAAPI and software extraction. Mirrors the exact FFmpeg commands and
-PIL resize logic used by the main script so results reflect real-world performance.
+Benchmarks sprite sheet generation with a single ffmpeg pass: frames are sampled
+with the fps filter, scaled, and assembled by ffmpeg's native tile filter.
+Supports VAAPI (hardware decode) and software decode.
 
 Usage:
     python benchmarking/sprite_benchmark.py --input video.mkv --output sprite.jpg [options]
@@ -13,117 +13,69 @@ Usage:
 import os
 import sys
 import time
-import shutil
 import argparse
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Allow imports from project root
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import config
+from helpers import probe
 from helpers.vaapi_utils import vaapi_available
-from PIL import Image
 
 
 def get_video_duration(input_file):
-    result = subprocess.run([
-        config.ffprobe, '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        input_file
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        return float(result.stdout.strip())
-    except (ValueError, TypeError):
-        stderr = result.stderr.decode('utf-8', errors='replace').strip()
-        raise RuntimeError(f"Could not determine duration for {input_file}: {stderr}")
-
-
-def extract_frame(input_file, timestamp, output_file, use_vaapi, vaapi_device, max_width, max_height, verbose):
-    """Extract a single frame — mirrors VideoSpriteGenerator.extract_and_resize()"""
-    if use_vaapi:
-        command = [
-            config.ffmpeg, '-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi',
-            '-vaapi_device', vaapi_device,
-            '-v', 'error', '-y',
-            '-ss', str(timestamp), '-i', input_file,
-            '-frames:v', '1',
-            '-vf', f'scale_vaapi={max_width}:-2,hwdownload,format=bgr0',
-            '-c:v', 'png', output_file,
-            '-loglevel', 'quiet'
-        ]
-    else:
-        command = [
-            config.ffmpeg,
-            '-ss', str(timestamp),
-            '-i', input_file,
-            '-frames:v', '1',
-            '-q:v', '2',
-            output_file,
-            '-loglevel', 'quiet'
-        ]
-    if verbose:
-        print(f"  frame: {' '.join(command)}")
-    subprocess.run(command, check=True)
-    # Resize in PIL — matches VideoSpriteGenerator.extract_and_resize()
-    with Image.open(output_file) as img:
-        img = img.resize((max_width, max_height), Image.Resampling.LANCZOS)
-        img.save(output_file)
-    return output_file
+    return probe.get_video_duration(input_file, config.ffprobe)
 
 
-def build_sprite(frame_files, output_file, columns, rows, max_width, max_height):
-    """Assemble extracted frames into a sprite sheet — mirrors VideoSpriteGenerator.create_sprite()"""
-    sprite = Image.new('RGB', (columns * max_width, rows * max_height))
-    for idx, frame_file in enumerate(frame_files):
-        with Image.open(frame_file) as img:
-            x = (idx % columns) * max_width
-            y = (idx // columns) * max_height
-            sprite.paste(img, (x, y))
-    sprite.save(output_file)
+def build_command(input_file, output_file, duration, use_vaapi, vaapi_device,
+                  total_shots, columns, rows, max_width, max_height, keyframes_only=False):
+    """Sample, scale and tile every frame in one ffmpeg pass — no per-frame files or PIL assembly"""
+    sample = f'fps={total_shots}/{duration}'
+    tile = f'tile={columns}x{rows}'
+    command = [config.ffmpeg]
+    if use_vaapi:
+        # Decoded surfaces stay in GPU memory through sampling and scaling; only the
+        # 160×90 thumbnails are downloaded for the CPU tile filter
+        command.extend(['-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi', '-vaapi_device', vaapi_device])
+        vf = f'{sample},scale_vaapi={max_width}:{max_height},hwdownload,format=nv12,{tile}'
+    else:
+        vf = f'{sample},scale={max_width}:{max_height},{tile}'
+    if keyframes_only:
+        # Decode keyframes only — any nearby keyframe is fine for a thumbnail and the
+        # decoder skips everything in between (roughly GOP-length fewer decoded frames)
+        command.extend(['-skip_frame', 'nokey'])
+    command.extend([
+        '-i', input_file,
+        '-vf', vf,
+        '-frames:v', '1',
+        '-q:v', '3',
+        '-y', '-loglevel', 'quiet',
+        output_file
+    ])
+    return command
 
 
 def run_benchmark(input_file, output_file, use_vaapi, vaapi_device,
-                  total_shots, columns, rows, max_width, max_height, verbose):
+                  total_shots, columns, rows, max_width, max_height, verbose, keyframes_only=False):
     label = 'VAAPI' if use_vaapi else 'Software'
     print(f"\n[{label}] Starting sprite generation ({columns}×{rows} = {total_shots} frames)...")
 
-    temp_dir = os.path.join(os.getcwd(), ".tmp", f"bench_sprite_{'vaapi' if use_vaapi else 'software'}")
-    os.makedirs(temp_dir, exist_ok=True)
-
-    try:
-        duration = get_video_duration(input_file)
-        interval = duration / total_shots
-        timestamps = [i * interval for i in range(total_shots)]
-
-        t_frames_start = time.time()
-
-        def _extract(args):
-            i, ts = args
-            frame_file = os.path.join(temp_dir, f'frame_{i:03d}.jpg')
-            return extract_frame(input_file, ts, frame_file, use_vaapi, vaapi_device,
-                                 max_width, max_height, verbose)
-
-        with ThreadPoolExecutor(max_workers=config.max_workers) as executor:
-            frame_files = list(executor.map(_extract, enumerate(timestamps)))
-
-        t_frames_elapsed = time.time() - t_frames_start
-        print(f"  Frame extraction ({total_shots} frames): {t_frames_elapsed:.2f}s")
-
-        t_sprite_start = time.time()
-        build_sprite(frame_files, output_file, columns, rows, max_width, max_height)
-        t_sprite_elapsed = time.time() - t_sprite_start
-        print(f"  Sprite assembly: {t_sprite_elapsed:.2f}s")
+    duration = get_video_duration(input_file)
+    command = build_command(input_file, output_file, duration, use_vaapi, vaapi_device,
+                            total_shots, columns, rows, max_width, max_height, keyframes_only)
+    if verbose:
+        print(f"  sprite: {' '.join(command)}")
 
-        total = t_frames_elapsed + t_sprite_elapsed
-        size_mb = os.path.getsize(output_file) / (1024 * 1024) if os.path.exists(output_file) else 0
-        print(f"  Total: {total:.2f}s  |  Output: {size_mb:.1f} MB → {output_file}")
-        return total
+    t_start = time.time()
+    subprocess.run(command, check=True)
+    total = time.time() - t_start
+    print(f"  Frame extraction + tiling ({total_shots} frames, single pass): {total:.2f}s")
 
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+    size_mb = os.path.getsize(output_file) / (1024 * 1024) if os.path.exists(output_file) else 0
+    print(f"  Total: {total:.2f}s  |  Output: {size_mb:.1f} MB → {output_file}")
+    return total
 
 
 def main():
@@ -140,6 +92,8 @@ def main():
     parser.add_argument('--height',   type=int, default=90,  help='Thumbnail height in pixels (default: 90)')
     parser.add_argument('--all',      action='store_true',
                         help='Benchmark both VAAPI and software and compare')
+    parser.add_argument('--keyframes-only', action='store_true',
+                        help='Decode keyframes only (faster, but thumbnails snap to the nearest keyframe)')
     parser.add_argument('--verbose',  action='store_true', help='Show FFmpeg commands')
     args = parser.parse_args()
 
@@ -147,8 +101,6 @@ def main():
         print(f"Input file not found: {args.input}")
         sys.exit(1)
 
-    os.makedirs(os.path.join(os.getcwd(), ".tmp"), exist_ok=True)
-
     total_shots = args.columns * args.rows
     vaapi_ok, vaapi_device = vaapi_available() if not config.windows else (False, None)
 
@@ -171,7 +123,8 @@ def main():
             try:
                 results['VAAPI'] = run_benchmark(args.input, out, True, dev,
                                                  total_shots, args.columns, args.rows,
-                                                 args.width, args.height, args.verbose)
+                                                 args.width, args.height, args.verbose,
+                                                 args.keyframes_only)
             except Exception as e:
                 print(f"  VAAPI failed: {e}")
 
@@ -179,7 +132,8 @@ def main():
         try:
             results['Software'] = run_benchmark(args.input, out, False, None,
                                                 total_shots, args.columns, args.rows,
-                                                args.width, args.height, args.verbose)
+                                                args.width, args.height, args.verbose,
+                                                args.keyframes_only)
         except Exception as e:
             print(f"  Software failed: {e}")
 
@@ -206,7 +160,8 @@ def main():
         try:
             run_benchmark(args.input, args.output, use_vaapi, device,
                           total_shots, args.columns, args.rows,
-                          args.width, args.height, args.verbose)
+                          args.width, args.height, args.verbose,
+                          args.keyframes_only)
         except Exception as e:
             print(f"Benchmark failed: {e}")
             sys.exit(1)
@@ -79,6 +79,9 @@ error_log_max_mb   = 10               # Rotate error log when it exceeds this si
 
 per_page    = 25     # --batch-size:   Number of scenes to process per run
 max_workers = 4      # --max-workers:  Number of threads for parallel processing
+ffmpeg_threads = 0   # Threads per ffmpeg process (0 = auto: CPU cores / max_workers)
+                     # The videohashes binary (phash_backend = "binary") runs alongside a scene's ffmpeg render and is not capped
+ffmpeg_fail_fast = False   # Abort scene ffmpeg runs on the first decode error (-xerror -err_detect explode); slightly damaged files then fail instead of rendering
 batch_sleep = 5      # --batch-sleep:  Seconds to wait between batches (0 = no delay)
 dry_run     = False  # --dry-run:      Simulate processing without writing changes
 once        = False  # --once:         Run one batch then exit
@@ -92,6 +95,7 @@ filemask    = None   # --filemask:     Filter scenes by filename pattern (e.g. '
 vaapi          = True    # Enable VAAPI hardware acceleration if detected (Intel/AMD GPUs)
 nvenc          = False   # Enable NVIDIA NVENC hardware encoder (NVIDIA GPUs)
 hw_priority    = "vaapi" # Which encoder takes precedence when both are available: "vaapi" or "nvenc"
+vaapi_full_pipe = True   # Keep VAAPI frames on the GPU from decode through encode (falls back to upload on failure)
 vaapi_override = None    # Set by --vaapi / --novaapi CLI flags at runtime (True/False/None)
 
 # ─────────────────────────────────────────────
@@ -0,0 +1,78 @@
+# ffmpeg_fused.py
+
+import os
+import subprocess
+
+from helpers.ffmpeg_utils import thread_args, fail_fast_args
+from helpers import watchdog
+
+def cover_timestamp(duration):
+    """Grab the cover 30s in, or 5s in for clips shorter than that (same as the single-step path)"""
+    return 30 if duration > 30 else 5
+
+def run_fused(filename, duration, ffmpeg='ffmpeg', sprite=None, preview=None, cover_file=None, vaapi_device=None):
+    """
+    Render a scene's sprite, preview and cover still with one ffmpeg invocation.
+
+    `sprite` and `preview` are configured VideoSpriteGenerator / PreviewVideoGenerator
+    instances (or None to skip), `cover_file` is the JPG path for the cover still.
+    Only the sprite needs a full decode of the file; the preview clips and the cover
+    are seeked inputs of the same process, so no part of the file is decoded twice.
+
+    Returns the list of outputs written ('sprite', 'preview', 'cover'). On failure
+    every output of the invocation is removed and a RuntimeError is raised, so the
+    caller can fall back to the per-step generators.
+    """
+    use_vaapi = bool(vaapi_device)
+    command = [ffmpeg, '-v', 'error', '-y', '-nostdin']
+    if use_vaapi:
+        command.extend(['-vaapi_device', vaapi_device])
+
+    inputs, graphs, outputs, produced = [], [], [], []
+    next_input = 0
+
+    if sprite is not None:
+        sprite_inputs, sprite_graph, sprite_outputs = sprite.build_graph(duration, bool(sprite.use_vaapi) and use_vaapi, index=next_input)
+        inputs.extend(sprite_inputs)
+        graphs.append(sprite_graph)
+        outputs.extend(sprite_outputs)
+        produced.append(('sprite', sprite.sprite_path))
+        next_input += 1
+
+    if preview is not None:
+        start_times = preview.get_start_times(duration)
+        include_audio = preview.include_audio and preview.has_audio_stream()
+        preview_inputs, preview_graph, preview_outputs = preview.build_graph(start_times, include_audio, first_input=next_input)
+        inputs.extend(preview_inputs)
+        graphs.append(preview_graph)
+        outputs.extend(preview_outputs)
+        produced.append(('preview', preview.output_path))
+        next_input += len(start_times)
+
+    if cover_file is not None:
+        inputs.extend(thread_args() + fail_fast_args() + ['-ss', str(cover_timestamp(duration)), '-i', filename])
+        outputs.extend(['-map', f'{next_input}:v:0', '-frames:v', '1'] + thread_args() + [cover_file])
+        produced.append(('cover', cover_file))
+        next_input += 1
+
+    if not produced:
+        return []
+
+    command.extend(inputs)
+    if graphs:
+        command.extend(['-filter_complex', ';'.join(graphs)])
+    command.extend(outputs)
+
+    try:
+        watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        for _, path in produced:
+            if os.path.exists(path):
+                os.remove(path)
+        stderr = (e.stderr or b'').decode('utf-8', errors='replace').strip().splitlines()
+        detail = stderr[-1] if stderr else str(e)
+        raise RuntimeError(f"Fused ffmpeg run failed: {detail}")
+
+    if sprite is not None and os.path.exists(sprite.sprite_path):
+        sprite.write_vtt(duration / sprite.total_shots)
+    return [name for name, path in produced if os.path.exists(path)]
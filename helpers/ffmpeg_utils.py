@@ -0,0 +1,30 @@
+# ffmpeg_utils.py
+
+import config
+
+def thread_args(full_pipe=False):
+    """
+    Return the `-threads` option for one ffmpeg input or output.
+
+    config.ffmpeg_threads is resolved at startup to CPU cores / max_workers (or set
+    with --ffmpeg-threads-per-invocation), so max_workers concurrent ffmpeg processes
+    share the machine instead of each starting a full set of decoder/encoder threads.
+    Empty when uncapped (0) or for a VAAPI full-pipe stream, where decode and encode
+    run on the GPU and the option has nothing to limit.
+    """
+    threads = getattr(config, 'ffmpeg_threads', 0)
+    if threads and not full_pipe:
+        return ['-threads', str(threads)]
+    return []
+
+def fail_fast_args():
+    """
+    Return the options that make ffmpeg exit on the first decode error, for one input.
+
+    With config.ffmpeg_fail_fast a corrupt file fails its scene in seconds instead of
+    decoding garbage (or stalling) until a timeout. Off by default: many files with
+    minor stream damage render fine today and would be tagged as errors instead.
+    """
+    if getattr(config, 'ffmpeg_fail_fast', False):
+        return ['-xerror', '-err_detect', 'explode']
+    return []
@@ -2,7 +2,9 @@
 
 import os
 import sys
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from helpers.stash_utils import stash
 import config
 
@@ -32,11 +34,26 @@ def check_phash_backend():
         except ImportError as e:
             return False, f"Missing dependency: {e} — run: pip install numpy scipy"
 
+# Set once ffmpeg/ffprobe have run successfully; later checks only stat the binaries
+_ffmpeg_version_checked = False
+
 def check_ffmpeg_available():
     """Verify ffmpeg and ffprobe are available"""
+    global _ffmpeg_version_checked
+    for binary in (config.ffmpeg, config.ffprobe):
+        if not shutil.which(binary):
+            return False, f"FFmpeg/FFprobe not available: {binary} not found or not executable"
+    if _ffmpeg_version_checked:
+        return True, "FFmpeg and FFprobe available"
     try:
-        subprocess.run([config.ffmpeg, '-version'], capture_output=True, check=True, timeout=10)
-        subprocess.run([config.ffprobe, '-version'], capture_output=True, check=True, timeout=10)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(subprocess.run, [binary, '-version'], capture_output=True, check=True, timeout=10)
+                for binary in (config.ffmpeg, config.ffprobe)
+            ]
+            for future in futures:
+                future.result()
+        _ffmpeg_version_checked = True
         return True, "FFmpeg and FFprobe available"
     except (subprocess.CalledProcessError, FileNotFoundError) as e:
         return False, f"FFmpeg/FFprobe not available: {e}"
@@ -143,7 +160,12 @@ def check_temp_directory():
         return False, f"Cannot write to temp directory: {e}"
 
 def run_health_check(vaapi_device=None):
-    """Run all health checks and return results"""
+    """
+    Run all health checks and return results.
+
+    Called once per process: by --health-check, or at startup before the first
+    batch. Batches do not re-run the checks.
+    """
     checks = [
         ("Stash API Connection", check_stash_connection),
         ("PHash Backend", check_phash_backend),
@@ -164,9 +186,14 @@ def run_health_check(vaapi_device=None):
     print("\n🏥 Running Health Checks...")
     print("=" * 60)
 
-    for check_name, check_func in checks:
+    # Checks are independent and mostly wait on subprocesses or the network, so run
+    # them concurrently and report in the original order
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [(check_name, executor.submit(check_func)) for check_name, check_func in checks]
+
+    for check_name, future in futures:
         try:
-            passed, message = check_func()
+            passed, message = future.result()
             status = "✅" if passed else "❌"
             print(f"{status} {check_name}: {message}")
             results.append((check_name, passed, message))
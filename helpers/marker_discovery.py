@@ -2,6 +2,7 @@
 
 import os
 from helpers.stash_utils import stash
+from helpers.path_utils import translate_path
 import config
 
 _PAGE_SIZE = 100
@@ -17,13 +18,6 @@ query findSceneMarkers($scene_marker_filter: SceneMarkerFilterType, $filter: Fin
 }
 """
 
-def translate_path(docker_path):
-    """Translate Stash/Docker paths to local paths using config.translations"""
-    for t in config.translations:
-        if docker_path.startswith(t['orig']):
-            return docker_path.replace(t['orig'], t['local'], 1)
-    return docker_path
-
 def discover_missing_markers(limit=None):
     """
     Discover markers that need media generation, grouped by scene.
@@ -5,14 +5,17 @@ import os
 import shutil
 import time
 from datetime import datetime
+import config
 from config import verbose, nvenc
+from helpers.ffmpeg_utils import thread_args
+from helpers import watchdog
 
 class MarkerGenerator:
     def __init__(self, video_path, marker_seconds, oshash, output_base_dir,
                  ffmpeg='ffmpeg', ffprobe='ffprobe',
                  preview_enabled=True, thumbnail_enabled=True, screenshot_enabled=True,
                  preview_duration=20, thumbnail_duration=5, thumbnail_fps=12,
-                 use_vaapi=None, vaapi_device=None):
+                 use_vaapi=None, vaapi_device=None, hw_decode=True):
         """
         Initialize marker generator for creating marker media files.
 
@@ -31,6 +34,7 @@ class MarkerGenerator:
             thumbnail_fps: WebP animation frame rate
             use_vaapi: Enable VAAPI hardware acceleration
             vaapi_device: VAAPI device path
+            hw_decode: The GPU can decode this file's codec (allows the VAAPI full pipeline)
         """
         self.video_path = os.path.abspath(video_path.strip('"').strip("'"))
         self.marker_seconds = marker_seconds
@@ -56,10 +60,36 @@ class MarkerGenerator:
         self.thumbnail_fps = thumbnail_fps
         self.use_vaapi = use_vaapi
         self.vaapi_device = vaapi_device
+        self.full_pipe = getattr(config, 'vaapi_full_pipe', True) and hw_decode
 
         # Temp directory
         self.temp_dir = os.path.abspath(os.path.join(".tmp", f"marker_{oshash}_{self.marker_int}"))
 
+    def _vaapi_preview_command(self, full_pipe):
+        """VAAPI encode; with full_pipe the decode and scale stay on the GPU as well"""
+        if full_pipe:
+            hwaccel = ['-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi']
+            vf = 'scale_vaapi=640:-2:format=nv12'
+        else:
+            hwaccel = []
+            vf = 'format=nv12,hwupload,scale_vaapi=640:-2'
+        return [
+            self.ffmpeg, '-y',
+            '-vaapi_device', self.vaapi_device,
+            *hwaccel,
+            '-ss', str(self.marker_seconds),
+            '-t', str(self.preview_duration),
+            *thread_args(full_pipe),
+            '-i', self.video_path,
+            '-vf', vf,
+            '-c:v', 'h264_vaapi',
+            '-global_quality', '18',
+            '-an',
+            '-loglevel', 'quiet',
+            *thread_args(full_pipe),
+            self.mp4_path
+        ]
+
     def generate_preview(self):
         """
         Generate MP4 preview (20-second clip starting at marker timestamp).
@@ -73,28 +103,18 @@ class MarkerGenerator:
         os.makedirs(os.path.dirname(self.mp4_path), exist_ok=True)
 
         use_vaapi = bool(self.use_vaapi) and bool(self.vaapi_device)
+        full_pipe = use_vaapi and self.full_pipe
 
         if use_vaapi:
             # VAAPI hardware-accelerated encoding
-            command = [
-                self.ffmpeg, '-y',
-                '-vaapi_device', self.vaapi_device,
-                '-ss', str(self.marker_seconds),
-                '-t', str(self.preview_duration),
-                '-i', self.video_path,
-                '-vf', 'format=nv12,hwupload,scale_vaapi=640:-2',
-                '-c:v', 'h264_vaapi',
-                '-global_quality', '18',
-                '-an',
-                '-loglevel', 'quiet',
-                self.mp4_path
-            ]
+            command = self._vaapi_preview_command(full_pipe)
         elif nvenc:
             # NVENC hardware-accelerated encoding
             command = [
                 self.ffmpeg, '-y',
                 '-ss', str(self.marker_seconds),
                 '-t', str(self.preview_duration),
+                *thread_args(),
                 '-i', self.video_path,
                 '-vf', 'scale=640:-2',
                 '-c:v', 'h264_nvenc',
@@ -102,6 +122,7 @@ class MarkerGenerator:
                 '-preset', 'p4',
                 '-an',
                 '-loglevel', 'quiet',
+                *thread_args(),
                 self.mp4_path
             ]
         else:
@@ -110,6 +131,7 @@ class MarkerGenerator:
                 self.ffmpeg, '-y',
                 '-ss', str(self.marker_seconds),
                 '-t', str(self.preview_duration),
+                *thread_args(),
                 '-i', self.video_path,
                 '-vf', 'scale=640:-2',
                 '-c:v', 'libx264',
@@ -117,11 +139,19 @@ class MarkerGenerator:
                 '-preset', 'slow',
                 '-an',
                 '-loglevel', 'quiet',
+                *thread_args(),
                 self.mp4_path
             ]
 
         try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
+            try:
+                watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
+            except subprocess.CalledProcessError:
+                if not full_pipe:
+                    raise
+                # Hardware decode can fail for codecs the GPU doesn't support; retry with software decode + upload
+                command = self._vaapi_preview_command(False)
+                watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
             return os.path.exists(self.mp4_path)
         except subprocess.CalledProcessError as e:
             stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
@@ -145,6 +175,7 @@ class MarkerGenerator:
             self.ffmpeg, '-y',
             '-ss', str(self.marker_seconds),
             '-t', str(self.thumbnail_duration),
+            *thread_args(),
             '-i', self.video_path,
             '-vf', f'scale=640:-2,fps={self.thumbnail_fps}',
             '-c:v', 'libwebp',
@@ -154,11 +185,12 @@ class MarkerGenerator:
             '-preset', 'default',
             '-loop', '0',  # Infinite loop
             '-loglevel', 'quiet',
+            *thread_args(),
             self.webp_path
         ]
 
         try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+            watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
             return os.path.exists(self.webp_path)
         except subprocess.CalledProcessError as e:
             stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
@@ -189,7 +221,7 @@ class MarkerGenerator:
         ]
 
         try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+            watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
             return os.path.exists(self.jpg_path)
         except subprocess.CalledProcessError as e:
             stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
@@ -0,0 +1,17 @@
+# path_utils.py
+
+import config
+
+# (orig, local) prefix pairs from config.translations, longest prefix first so the
+# most specific mapping wins when prefixes overlap
+TRANSLATIONS = tuple(sorted(
+    ((t['orig'], t['local']) for t in config.translations),
+    key=lambda pair: -len(pair[0])
+))
+
+def translate_path(path):
+    """Translate a Stash path to a local path using the longest matching 'orig' prefix"""
+    for orig, local in TRANSLATIONS:
+        if path.startswith(orig):
+            return local + path[len(orig):]
+    return path
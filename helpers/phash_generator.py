@@ -35,6 +35,7 @@ from PIL import Image
 from scipy.fft import dct
 
 import config
+from helpers import probe, watchdog
 
 # ─────────────────────────────────────────────
 # Constants (must match goimagehash PerceptionHash)
@@ -107,19 +108,8 @@ def _nfnt_resize_bilinear(img_pil, dst_w, dst_h):
 # ─────────────────────────────────────────────
 
 def _get_duration(video_path):
-    """Return video duration in seconds via ffprobe."""
-    result = subprocess.run(
-        [config.ffprobe,
-         '-v', 'error',
-         '-show_entries', 'format=duration',
-         '-of', 'default=noprint_wrappers=1:nokey=1',
-         video_path],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        check=True,
-        timeout=30,
-    )
-    return float(result.stdout.strip())
+    """Return video duration in seconds (cached; shared with the sprite/preview lookups)."""
+    return probe.get_video_duration(video_path, config.ffprobe)
 
 
 def _extract_frame_software(video_path, timestamp):
@@ -127,7 +117,7 @@ def _extract_frame_software(video_path, timestamp):
     fd, tmp = tempfile.mkstemp(suffix='.bmp')
     os.close(fd)
     try:
-        subprocess.run(
+        watchdog.run(
             [config.ffmpeg,
              '-ss', f'{timestamp:.6f}',
              '-i', video_path,
@@ -158,7 +148,7 @@ def _extract_frame_vaapi(video_path, timestamp, vaapi_device):
     fd, tmp = tempfile.mkstemp(suffix='.bmp')
     os.close(fd)
     try:
-        subprocess.run(
+        watchdog.run(
             [config.ffmpeg,
              '-vaapi_device', vaapi_device,
              '-hwaccel', 'vaapi',
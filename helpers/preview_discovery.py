@@ -2,17 +2,11 @@
 
 import os
 from helpers.stash_utils import stash
+from helpers.path_utils import translate_path
 import config
 
 _PAGE_SIZE = 100
 
-def translate_path(docker_path):
-    """Translate Stash/Docker paths to local paths using config.translations"""
-    for t in config.translations:
-        if docker_path.startswith(t['orig']):
-            return docker_path.replace(t['orig'], t['local'], 1)
-    return docker_path
-
 def discover_missing_previews(limit=None):
     """
     Discover scenes that are missing preview videos for standalone generation.
@@ -26,6 +20,7 @@ def discover_missing_previews(limit=None):
             - video_path: Translated local video path
             - oshash: Scene file hash
             - duration: Video duration in seconds
+            - audio_codec: Audio codec reported by Stash ('' when there is no audio)
             - scene_title: Scene title for logging
     """
     missing = []
@@ -35,7 +30,7 @@ def discover_missing_previews(limit=None):
         scenes = stash.find_scenes(
             f={},
             filter={"per_page": _PAGE_SIZE, "page": page},
-            fragment="id title files { id path fingerprints { type value } duration }"
+            fragment="id title files { id path fingerprints { type value } duration audio_codec }"
         )
 
         if not scenes:
@@ -48,10 +43,12 @@ def discover_missing_previews(limit=None):
             oshash = None
             video_path = None
             duration = 0
+            audio_codec = None
 
             for file in scene.get('files', []):
                 video_path = file.get('path')
                 duration = file.get('duration', 0)
+                audio_codec = file.get('audio_codec')
 
                 for fp in file.get('fingerprints', []):
                     if fp.get('type', '').lower() == 'oshash':
@@ -78,6 +75,7 @@ def discover_missing_previews(limit=None):
                         'video_path': translated_path,
                         'oshash': oshash,
                         'duration': duration,
+                        'audio_codec': audio_codec,
                         'scene_title': scene_title
                     })
 
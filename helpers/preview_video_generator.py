@@ -2,20 +2,20 @@
 
 import subprocess
 import os
-import shutil
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
-from config import verbose, nvenc, max_workers
+import config
+from config import verbose, nvenc
+from helpers import probe, watchdog
+from helpers.ffmpeg_utils import thread_args, fail_fast_args
 import time
 from datetime import datetime
 
 class PreviewVideoGenerator:
     def __init__(self, filename, output_path, filehash, ffmpeg='ffmpeg', ffprobe='ffprobe',
                  preview_clips=15, clip_length=1, skip_seconds=0, include_audio=True,
-                 scene_id=None, scene_name=None, use_vaapi=None, vaapi_device=None):
+                 scene_id=None, scene_name=None, use_vaapi=None, vaapi_device=None, duration=None, hw_decode=True,
+                 audio_codec=None):
         self.filename = os.path.abspath(filename.strip('"').strip("'"))
         self.output_path = os.path.abspath(output_path)
-        self.temp_dir = os.path.abspath(os.path.join(".tmp", f"preview_temp_{filehash}"))
         self.num_clips = preview_clips
         self.clip_length = clip_length
         self.skip_seconds = skip_seconds
@@ -26,82 +26,19 @@ class PreviewVideoGenerator:
         self.scene_name = scene_name
         self.use_vaapi = use_vaapi
         self.vaapi_device = vaapi_device
+        self.duration = duration  # Seconds, as reported by Stash; probed with ffprobe when missing
+        self.audio_codec = audio_codec  # As reported by Stash ('' = no audio); probed when missing
+        self.full_pipe = getattr(config, 'vaapi_full_pipe', True) and hw_decode  # VAAPI decode → scale → encode without leaving the GPU
 
     def get_video_duration(self):
-        result = subprocess.run(
-            [self.ffprobe, '-v', 'error', '-show_entries', 'format=duration',
-             '-of', 'default=noprint_wrappers=1:nokey=1', self.filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        try:
-            return float(result.stdout.strip())
-        except (ValueError, TypeError):
-            err = result.stderr.decode('utf-8', errors='replace').strip()
-            raise RuntimeError(f"Could not determine duration for {self.filename}: {err}")
-
-    def clean_previous_clips(self):
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        if self.duration:
+            return float(self.duration)
+        return probe.get_video_duration(self.filename, self.ffprobe)
 
-    def generate_clips(self):
-        os.makedirs(self.temp_dir, exist_ok=True)
-        video_duration = self.get_video_duration()
-        start_times = self.get_start_times(video_duration)
-        use_vaapi = bool(self.use_vaapi) and bool(self.vaapi_device)
-
-        def extract_clip(i, start_time):
-            clip_file = os.path.join(self.temp_dir, f"clip_{i:03d}.mp4")
-            audio_args = ['-c:a', 'aac', '-b:a', '192k'] if self.include_audio else ['-an']
-            if use_vaapi:
-                command = [self.ffmpeg,
-                    '-vaapi_device', self.vaapi_device,
-                    '-ss', str(start_time),
-                    '-i', self.filename,
-                    '-t', str(self.clip_length),
-                    '-vf', 'format=nv12,hwupload,scale_vaapi=640:360',
-                    '-c:v', 'h264_vaapi',
-                    '-global_quality', '18',
-                ] + audio_args + ['-y', '-loglevel', 'quiet', clip_file]
-            elif nvenc:
-                command = [self.ffmpeg,
-                    '-ss', str(start_time),
-                    '-i', self.filename,
-                    '-t', str(self.clip_length),
-                    '-s', '640x360',
-                    '-c:v', 'h264_nvenc',
-                    '-cq:v', '18',
-                    '-preset', 'p4',
-                ] + audio_args + ['-y', '-loglevel', 'quiet', clip_file]
-            else:
-                command = [self.ffmpeg,
-                    '-ss', str(start_time),
-                    '-i', self.filename,
-                    '-t', str(self.clip_length),
-                    '-s', '640x360',
-                    '-c:v', 'libx264',
-                    '-crf', '18',
-                    '-preset', 'slow',
-                ] + audio_args + ['-y', '-loglevel', 'quiet', clip_file]
-            try:
-                subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except subprocess.CalledProcessError as e:
-                stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
-                detail = stderr[-1] if stderr else str(e)
-                print(f"❌ Failed to generate clip {i} for scene {self.scene_id} — {self.scene_name}: {detail}")
-                return None
-            return clip_file
-
-        clips = []
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(extract_clip, i, start_time) for i, start_time in enumerate(start_times)]
-            iterator = tqdm(futures, desc="🎞️ Generating Preview Clips", unit="clip") if verbose else futures
-            for future in iterator:
-                clip = future.result()
-                if clip:
-                    clips.append(clip)
-
-        return clips
+    def has_audio_stream(self):
+        if self.audio_codec is not None:
+            return bool(self.audio_codec)
+        return probe.has_audio_stream(self.filename, self.ffprobe)
 
     def get_start_times(self, video_duration):
         usable = video_duration - self.skip_seconds - self.clip_length
@@ -112,74 +49,98 @@ class PreviewVideoGenerator:
         interval = usable / (self.num_clips + 1)
         return [self.skip_seconds + interval * i for i in range(1, self.num_clips + 1)]
 
-    def concatenate_clips(self, clips):
-        missing = [clip for clip in clips if not os.path.exists(clip)]
-        if missing:
-            raise FileNotFoundError(f"Missing clips: {missing}")
-
-        concat_file = os.path.join(self.temp_dir, "clips.txt")
-        with open(concat_file, 'w') as f:
-            for clip in sorted(clips):
-                safe_path = os.path.normpath(clip).replace("\\", "/")
-                f.write(f"file '{safe_path}'\n")
+    def build_graph(self, start_times, include_audio, first_input=0):
+        """
+        Return (input args, filtergraph, output args) that cut every clip and join them.
 
+        Each clip is a separately seeked input of the source file, numbered from
+        `first_input`; the filtergraph resets the clip timestamps and feeds them to
+        the concat filter, so the preview is encoded once with no intermediate files.
+        """
         use_vaapi = bool(self.use_vaapi) and bool(self.vaapi_device)
-        audio_args = ['-c:a', 'aac', '-b:a', '192k'] if self.include_audio else ['-an']
+        full_pipe = use_vaapi and self.full_pipe
+        count = len(start_times)
 
-        command = [self.ffmpeg]
-        if use_vaapi:
-            # VAAPI pipeline for concat: GPU encode only
-            command.extend([
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-vaapi_device', self.vaapi_device,
-                '-vf', "format=nv12,hwupload,scale_vaapi=640:360",
-                '-c:v', 'h264_vaapi',
-                '-global_quality', '18',
-            ])
+        hwaccel = ['-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi'] if full_pipe else []
+        inputs = []
+        for start_time in start_times:
+            inputs.extend(thread_args(full_pipe) + fail_fast_args() + hwaccel + ['-ss', str(start_time), '-t', str(self.clip_length), '-i', self.filename])
+
+        filters = []
+        concat_inputs = ''
+        for i in range(count):
+            n = first_input + i
+            filters.append(f"[{n}:v:0]setpts=PTS-STARTPTS[v{i}]")
+            concat_inputs += f"[v{i}]"
+            if include_audio:
+                filters.append(f"[{n}:a:0]asetpts=PTS-STARTPTS[a{i}]")
+                concat_inputs += f"[a{i}]"
+
+        if full_pipe:
+            # Clips are decoded straight into GPU surfaces; scale and encode never touch system memory
+            video_chain = 'scale_vaapi=640:360:format=nv12'
+            video_args = ['-c:v', 'h264_vaapi', '-global_quality', '18']
+        elif use_vaapi:
+            # Single upload of the joined stream, scaled and encoded on the GPU
+            video_chain = 'format=nv12,hwupload,scale_vaapi=640:360'
+            video_args = ['-c:v', 'h264_vaapi', '-global_quality', '18']
         elif nvenc:
-            # NVENC (NVIDIA GPU) pipeline
-            command.extend([
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-vf', "scale=640:360",
-                '-c:v', 'h264_nvenc',
-                '-cq:v', '18',
-                '-preset', 'p4',
-            ])
+            video_chain = 'scale=640:360'
+            video_args = ['-c:v', 'h264_nvenc', '-cq:v', '18', '-preset', 'p4']
+        else:
+            video_chain = 'scale=640:360'
+            video_args = ['-c:v', 'libx264', '-crf', '18', '-preset', 'slow']
+
+        if include_audio:
+            filters.append(f"{concat_inputs}concat=n={count}:v=1:a=1[cv][out_a]")
+            audio_args = ['-map', '[out_a]', '-c:a', 'aac', '-b:a', '192k']
         else:
-            # Software encoding pipeline
-            command.extend([
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-vf', "scale=640:360",
-                '-c:v', 'libx264',
-                '-crf', '18',
-                '-preset', 'slow',
-            ])
-        command.extend(audio_args)
-        command.extend(['-y', '-loglevel', 'quiet', self.output_path])
+            filters.append(f"{concat_inputs}concat=n={count}:v=1:a=0[cv]")
+            audio_args = ['-an']
+        filters.append(f"[cv]{video_chain}[out_v]")
+
+        outputs = ['-map', '[out_v]'] + video_args + audio_args + thread_args(full_pipe) + [self.output_path]
+        return inputs, ';'.join(filters), outputs
+
+    def build_command(self, start_times, include_audio):
+        """Build a single ffmpeg command that cuts every clip and joins them."""
+        inputs, graph, outputs = self.build_graph(start_times, include_audio)
+        command = [self.ffmpeg]
+        if self.use_vaapi and self.vaapi_device:
+            command.extend(['-vaapi_device', self.vaapi_device])
+        command.extend(inputs)
+        command.extend(['-filter_complex', graph])
+        command.extend(['-y', '-loglevel', 'quiet'])
+        command.extend(outputs)
+        return command
+
+    def render_preview(self):
+        video_duration = self.get_video_duration()
+        start_times = self.get_start_times(video_duration)
+        include_audio = self.include_audio and self.has_audio_stream()
+        command = self.build_command(start_times, include_audio)
 
         try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
+            try:
+                watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
+            except subprocess.CalledProcessError:
+                if not (self.use_vaapi and self.vaapi_device and self.full_pipe):
+                    raise
+                # Hardware decode can fail for codecs/profiles the GPU doesn't support; retry
+                # once with software decode and a single upload before the VAAPI encoder
+                self.full_pipe = False
+                command = self.build_command(start_times, include_audio)
+                watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
         except subprocess.CalledProcessError as e:
             stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
             detail = stderr[-1] if stderr else str(e)
-            print(f"❌ Failed to concatenate preview for scene {self.scene_id} — {self.scene_name}: {detail}")
-            raise RuntimeError(f"FFmpeg failed to concatenate clips: {detail}")
+            print(f"❌ Failed to render preview for scene {self.scene_id} — {self.scene_name}: {detail}")
+            raise RuntimeError(f"FFmpeg failed to render preview: {detail}")
 
     def generate_preview(self):
-        self.clean_previous_clips()
         start = time.time()
-        clips = self.generate_clips()
-        if not clips:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ No clips generated for scene {self.scene_id} — {self.scene_name}")
-            return
         try:
-            self.concatenate_clips(clips)
+            self.render_preview()
             elapsed = time.time() - start
             if os.path.exists(self.output_path):
                 if verbose:
@@ -188,5 +149,3 @@ class PreviewVideoGenerator:
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Preview video not created for ID {self.scene_id} — {self.scene_name}")
         except Exception as e:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Preview generation failed for scene {self.scene_id} — {self.scene_name}: {e}")
-        finally:
-            self.clean_previous_clips()
@@ -0,0 +1,74 @@
+# probe.py
+
+import os
+import subprocess
+from functools import lru_cache
+
+import config
+
+# PyAV is optional: when installed, durations are read from the container header
+# in-process instead of forking ffprobe
+try:
+    import av
+except ImportError:
+    av = None
+
+# orjson is optional: faster parsing of the ffprobe JSON, straight from bytes
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+def _probe_pyav(path):
+    """(duration, has_audio) from the container header, or None if PyAV can't read a duration"""
+    try:
+        with av.open(path, metadata_errors='ignore') as container:
+            if container.duration:
+                return container.duration / av.time_base, bool(container.streams.audio)
+    except Exception:
+        pass
+    return None
+
+def _probe_ffprobe(path, ffprobe):
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-show_entries', 'format=duration:stream=codec_type', '-of', 'json', path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=30
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Could not determine duration for {path}: ffprobe timed out after 30s")
+    try:
+        info = json_loads(result.stdout)
+        duration = float(info['format']['duration'])
+    except (ValueError, TypeError, KeyError):
+        err = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"Could not determine duration for {path}: {err}")
+    return duration, any(stream.get('codec_type') == 'audio' for stream in info.get('streams', []))
+
+@lru_cache(maxsize=4096)
+def _probe_cached(path, mtime_ns, size, ffprobe):
+    if av is not None:
+        probed = _probe_pyav(path)
+        if probed:
+            return probed
+    return _probe_ffprobe(path, ffprobe)
+
+def _probe(path, ffprobe):
+    st = os.stat(path)
+    return _probe_cached(path, st.st_mtime_ns, st.st_size, ffprobe or config.ffprobe)
+
+def get_video_duration(path, ffprobe=None):
+    """
+    Return the container duration of a video in seconds.
+
+    Uses PyAV when it is installed and falls back to ffprobe otherwise (or when
+    PyAV cannot open the file). Results are memoized on (path, mtime, size), so
+    repeat lookups for an unchanged file are free; a modified file is re-probed.
+    """
+    return _probe(path, ffprobe)[0]
+
+def has_audio_stream(path, ffprobe=None):
+    """True if the video has an audio stream; shares the probe (and its cache) with get_video_duration()"""
+    return _probe(path, ffprobe)[1]
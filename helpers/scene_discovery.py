@@ -1,11 +1,47 @@
 # scene_discovery.py
 
 import random
-import os
-from fnmatch import fnmatch
+import re
 from helpers.stash_utils import stash
 import config
 
+def filemask_to_path_regex(filemask):
+    """
+    Translate a filename glob into a regex for Stash's path MATCHES_REGEX filter.
+
+    The glob is anchored to the last path component, so 'JoonMali*' matches
+    '/videos/JoonMali_01.mp4' but not '/JoonMali/other.mp4'. Only constructs
+    supported by Go's RE2 engine (used by Stash) are emitted.
+    """
+    parts = []
+    i, n = 0, len(filemask)
+    while i < n:
+        c = filemask[i]
+        i += 1
+        if c == '*':
+            parts.append(r'[^/\\]*')
+        elif c == '?':
+            parts.append(r'[^/\\]')
+        elif c == '[':
+            j = i
+            if j < n and filemask[j] in '!^':
+                j += 1
+            if j < n and filemask[j] == ']':
+                j += 1
+            while j < n and filemask[j] != ']':
+                j += 1
+            if j >= n:
+                parts.append(r'\[')
+            else:
+                body = filemask[i:j].replace('\\', r'\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = j + 1
+        else:
+            parts.append(re.escape(c))
+    return r'(^|[/\\])' + ''.join(parts) + '$'
+
 def discover_scenes():
     """
     Discovers a random batch of scenes to process.
@@ -13,22 +49,29 @@ def discover_scenes():
     - Excludes scenes already tagged with hashing_tag, hashing_error_tag, or cover_error_tag
     - Randomly selects one page of scenes to avoid overlap across multiple systems
     - Uses the current value of config.per_page, which may be overridden by CLI
+    - Applies config.filemask server-side so every fetched page is full of matching scenes
     """
 
-    # Step 1: Query all matching scene IDs (lightweight query, only returns 'id')
-    # This helps determine how many total scenes are available for processing
-    all_scenes = stash.find_scenes(
-        f={
-            "phash": {"value": "", "modifier": "IS_NULL"},
-            "tags": {"value": [config.hashing_tag, config.hashing_error_tag, config.cover_error_tag], "modifier": "EXCLUDES"}
-        },
-        filter={"per_page": -1},  # Retrieve all matching scene IDs
-        fragment="id"
+    scene_filter = {
+        "phash": {"value": "", "modifier": "IS_NULL"},
+        "tags": {"value": [config.hashing_tag, config.hashing_error_tag, config.cover_error_tag], "modifier": "EXCLUDES"}
+    }
+    if config.filemask:
+        scene_filter["path"] = {"value": filemask_to_path_regex(config.filemask), "modifier": "MATCHES_REGEX"}
+
+    # Step 1: Count matching scenes with a count-only query (one scene, 'id' only)
+    # This determines how many pages are available without materializing every ID
+    total_count, _ = stash.find_scenes(
+        f=scene_filter,
+        filter={"per_page": 1},
+        fragment="id",
+        get_count=True
     )
 
-    # Step 2: Count total matching scenes
-    total_count = len(all_scenes)
+    # Step 2: Bail out early if nothing matches
     if total_count == 0:
+        if config.filemask:
+            print(f"⚠️ Filemask '{config.filemask}' matched 0 scenes")
         print("🚫 No scenes found to process.")
         return []
 
@@ -43,17 +86,14 @@ def discover_scenes():
     # Step 5: Fetch the selected page of scenes with full metadata
     # These scenes will be claimed and processed by this node
     batch_scenes = stash.find_scenes(
-        f={
-            "phash": {"value": "", "modifier": "IS_NULL"},
-            "tags": {"value": [config.hashing_tag, config.hashing_error_tag, config.cover_error_tag], "modifier": "EXCLUDES"}
-        },
+        f=scene_filter,
         filter={
             "sort": "created_at",           # Sort by creation date (newest first)
             "direction": "DESC",
             "per_page": config.per_page,           # Limit to configured batch size
             "page": selected_page           # Use randomly selected page
         },
-        fragment="id files{id path fingerprints{value type}} paths{screenshot}"
+        fragment="id files{id path duration video_codec audio_codec fingerprints{value type}} paths{screenshot}"
     )
 
     # Step 6: Apply excluded_paths filter if specified
@@ -67,24 +107,5 @@ def discover_scenes():
         if excluded:
             print(f"🚫 Excluded {excluded} scene(s) matching excluded_paths")
 
-    # Step 7: Apply filemask filter if specified
-    if config.filemask:
-        filtered_scenes = []
-        for scene in batch_scenes:
-            # Check if any file path matches the pattern
-            for file in scene.get('files', []):
-                file_path = file.get('path', '')
-                filename = os.path.basename(file_path)
-                if fnmatch(filename, config.filemask):
-                    filtered_scenes.append(scene)
-                    break  # Only need one matching file per scene
-
-        if filtered_scenes:
-            print(f"🔍 Filemask '{config.filemask}' matched {len(filtered_scenes)} of {len(batch_scenes)} scenes")
-        else:
-            print(f"⚠️ Filemask '{config.filemask}' matched 0 scenes in this batch")
-
-        return filtered_scenes
-
-    # Step 8: Return the batch of scenes to be processed
+    # Step 7: Return the batch of scenes to be processed
     return batch_scenes
@@ -2,21 +2,34 @@
 
 import os
 import subprocess
-import json
 import base64
 import requests
-import shutil
-from datetime import datetime
+import tempfile
+import threading
+import time
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# orjson is optional: it parses the videohash output straight from bytes; the
+# stdlib parser accepts bytes too, so both paths skip the explicit UTF-8 decode
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 from helpers.video_sprite_generator import VideoSpriteGenerator
 from helpers.preview_video_generator import PreviewVideoGenerator
-from helpers.phash_generator import compute_phash
+from helpers.ffmpeg_fused import run_fused
+from helpers import probe, watchdog
+from helpers.path_utils import translate_path
+from helpers.vaapi_utils import can_hw_decode
+from helpers.ffmpeg_utils import fail_fast_args
 
 from config import (
     windows, binary, ffmpeg, ffprobe,
     sprite_path, preview_path,
     preview_audio, preview_clips, preview_clip_length, preview_skip_seconds,
-    translations,
     hashing_tag, hashing_error_tag, cover_error_tag
 )
 
@@ -25,6 +38,65 @@ from helpers.stash_utils import (
     update_phash, update_cover, log_scene_failure
 )
 
+def _ts():
+    """Log timestamp; time.strftime formats the current local time without building a datetime"""
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+# Keep-alive session for the cover placeholder checks, shared by all worker threads
+_http = requests.Session()
+_http.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=1))
+_http.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=1))
+
+# Cover uploads run in the background so the worker moves straight on to the sprite
+# and preview; pending uploads are drained before the interpreter exits
+_upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cover-upload")
+atexit.register(_upload_pool.shutdown, wait=True)
+
+def _upload_cover(scene_id, filename_pretty, cover_data):
+    try:
+        update_cover(scene_id, cover_data)
+    except Exception as e:
+        log_scene_failure(scene_id, filename_pretty, "cover image upload", e)
+        tag_scene_error(scene_id, cover_error_tag, str(e))
+
+# Seconds the phash binary gets once the scene starts waiting for it
+PHASH_COLLECT_TIMEOUT = 120
+
+def _start_phash(filename):
+    """
+    Launch the phash binary in the background.
+
+    A reader thread drains stdout/stderr while the worker renders, so the binary
+    can't block on a full pipe; returns (proc, reader, output).
+    """
+    proc = subprocess.Popen([binary, '-json', filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    watchdog.track(proc)
+    output = {}
+
+    def drain():
+        output['stdout'], output['stderr'] = proc.communicate()
+
+    reader = threading.Thread(target=drain, name="phash-reader", daemon=True)
+    reader.start()
+    return proc, reader, output
+
+def _collect_phash(proc, reader, output):
+    """Wait up to PHASH_COLLECT_TIMEOUT seconds (from now) for the binary; return its phash"""
+    reader.join(timeout=PHASH_COLLECT_TIMEOUT)
+    if reader.is_alive():
+        proc.kill()
+        reader.join()
+        raise subprocess.TimeoutExpired(proc.args, PHASH_COLLECT_TIMEOUT)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args, output['stdout'], output['stderr'])
+    return json_loads(output['stdout'])['phash']
+
+def is_placeholder_cover(url):
+    """True when Stash serves its default SVG for the screenshot; only the head of the response is read"""
+    with _http.get(url, stream=True, timeout=10) as response:
+        head = next(response.iter_content(512), b"")
+    return b"<svg" in head.lower()
+
 def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, vaapi_device=None):
     import time
     import config
@@ -36,21 +108,22 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
         return {'success': False, 'elapsed_time': 0, 'scene_id': scene.get('id')}
     file_id = scene['files'][0]['id']
     filename = scene['files'][0]['path']
-    filename_pretty = os.path.basename(filename)
+    # Stash may run on Windows while this node runs elsewhere; split on either separator
+    filename_pretty = os.path.basename(filename.replace('\\', '/'))
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = _ts()
     if index and total_batch:
         print(f"[{timestamp}] 📦 Scene #{index} of {total_batch}: ID {scene_id} — {filename_pretty}")
     else:
         print(f"[{timestamp}] 📦 Processing scene: ID {scene_id} — {filename_pretty}")
 
-    for t in translations:
-        filename = filename.replace(t['orig'], t['local'], 1)
+    filename = translate_path(filename)
 
-    filehash = ""
-    for fp in scene['files'][0].get('fingerprints', []):
-        if fp['type'].lower() == "oshash":
-            filehash = fp['value']
+    # VAAPI can still encode when the GPU can't decode this codec; only the decode side falls back to software
+    hw_decode = vaapi_supported and can_hw_decode(scene['files'][0].get('video_codec'), getattr(config, 'vaapi_codecs', None))
+
+    # Stash reports fingerprint types in lowercase
+    filehash = next((fp['value'] for fp in scene['files'][0].get('fingerprints', ()) if fp['type'] == "oshash"), "")
 
     if not filehash or ":" in filehash or "\\" in filehash or "/" in filehash:
         log_scene_failure(scene_id, filename_pretty, "oshash validation", f"Invalid or missing oshash: {filehash!r}")
@@ -62,7 +135,7 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
     file_exists = os.path.exists(filename)
 
     if config.verbose:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔍 Translated path: {filename}")
+        print(f"[{_ts()}] 🔍 Translated path: {filename}")
 
     if not file_exists:
         log_scene_failure(scene_id, filename_pretty, "file check", "File not found after translation")
@@ -72,6 +145,9 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
 
     claim_scene(scene_id)
 
+    phash_proc = None
+    scratch = None
+    watchdog.scene_started(scene_id)
     try:
         performed_options = []
 
@@ -86,13 +162,20 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
             if config.debug:
                 phash_elapsed = time.time() - phash_start
                 print(f"🟡 [DEBUG] Finished phash generation for {filename_pretty} in {phash_elapsed:.2f} seconds")
+        elif config.phash_backend == "binary":
+            # Started here and collected after the cover step, so the binary's decode overlaps
+            # the cover check, fused render and cover extraction instead of running ahead of them
+            try:
+                phash_proc, phash_reader, phash_output = _start_phash(filename)
+            except Exception as e:
+                log_scene_failure(scene_id, filename_pretty, "hashing", e)
+                tag_scene_error(scene_id, hashing_error_tag, str(e))
+                success = False
         else:
             try:
-                if config.phash_backend == "binary":
-                    proc = subprocess.run([binary, '-json', filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=120)
-                    phash = json.loads(proc.stdout.decode("utf-8"))['phash']
-                else:
-                    phash = compute_phash(filename, vaapi_device=vaapi_device)['phash']
+                # numpy/scipy/PIL are only loaded when the internal backend is in use
+                from helpers.phash_generator import compute_phash
+                phash = compute_phash(filename, vaapi_device=vaapi_device if hw_decode else None)['phash']
                 update_phash(file_id, phash)
                 performed_options.append("phash")
                 if config.debug:
@@ -104,14 +187,63 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                 success = False
                 # Don't return early - release_scene in finally block
 
+        cover_needed = False
         try:
             cover_image = scene['paths'].get('screenshot')
-            if cover_image and "<svg" in requests.get(cover_image, timeout=10).content.decode('latin_1').lower():
-                temp_dir = os.path.abspath(os.path.join(".tmp", f"cover_temp_{filehash}"))
-                os.makedirs(temp_dir, exist_ok=True)
-                image_filename = os.path.join(temp_dir, f"{filehash}_cover.jpg")
+            cover_needed = bool(cover_image) and is_placeholder_cover(cover_image)
+            if cover_needed:
+                # Per-scene scratch directory, removed when the scene finishes
+                scratch = tempfile.TemporaryDirectory(prefix=f"scene_{scene_id}_", dir=os.path.abspath(".tmp"))
+                image_filename = os.path.join(scratch.name, f"{filehash}_cover.jpg")
+        except Exception as e:
+            log_scene_failure(scene_id, filename_pretty, "cover image setup", e)
+            tag_scene_error(scene_id, cover_error_tag, str(e))
+            cover_needed = False
+
+        sprite_file = os.path.join(sprite_path, f"{filehash}_sprite.jpg")
+        vtt_file = os.path.join(sprite_path, f"{filehash}_thumbs.vtt")
+        preview_file = os.path.join(preview_path, f"{filehash}.mp4")
+        sprite_needed = config.generate_sprite and not os.path.exists(sprite_file)
+        preview_needed = config.generate_preview and not os.path.exists(preview_file)
+
+        # When two or more outputs are missing, render them all from one ffmpeg process.
+        # Anything it doesn't produce falls through to the per-step generators below.
+        fused = []
+        if not config.dry_run and cover_needed + sprite_needed + preview_needed >= 2:
+            fused_start = time.time()
+            try:
+                duration = float(scene['files'][0].get('duration') or probe.get_video_duration(filename, ffprobe))
+                sprite_generator = VideoSpriteGenerator(
+                    filename, sprite_file, vtt_file, ffmpeg, ffprobe,
+                    use_vaapi=hw_decode, vaapi_device=vaapi_device
+                ) if sprite_needed else None
+                preview_generator = PreviewVideoGenerator(
+                    filename, preview_file, filehash,
+                    ffmpeg=ffmpeg, ffprobe=ffprobe,
+                    preview_clips=preview_clips, clip_length=preview_clip_length,
+                    skip_seconds=preview_skip_seconds, include_audio=preview_audio,
+                    scene_id=scene_id, scene_name=filename_pretty,
+                    use_vaapi=vaapi_supported, vaapi_device=vaapi_device,
+                    duration=duration, hw_decode=hw_decode,
+                    audio_codec=scene['files'][0].get('audio_codec')
+                ) if preview_needed else None
+                fused = run_fused(
+                    filename, duration, ffmpeg,
+                    sprite=sprite_generator, preview=preview_generator,
+                    cover_file=image_filename if cover_needed else None,
+                    vaapi_device=vaapi_device if vaapi_supported else None
+                )
+                if config.verbose:
+                    print(f"[{_ts()}] ✅ Fused ffmpeg pass ({', '.join(fused)}) complete for {filename_pretty} in {time.time() - fused_start:.2f} seconds.")
+            except Exception as e:
+                if config.verbose:
+                    print(f"[{_ts()}] ⚠️ Fused ffmpeg pass failed for {filename_pretty}, falling back to per-step generation: {e}")
+
+        try:
+            if cover_needed:
                 ffmpegcmd = [
                     ffmpeg, '-hide_banner', '-loglevel', 'error',
+                    *fail_fast_args(),
                     '-i', filename, '-ss', '00:00:30', '-vframes', '1',
                     image_filename, '-nostdin'
                 ]
@@ -127,15 +259,16 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                         print(f"🟡 [DEBUG] Finished cover image extraction for {filename_pretty} in {cover_elapsed:.2f} seconds")
                 else:
                     try:
-                        subprocess.run(ffmpegcmd, check=True, timeout=120, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                        if "cover" not in fused:
+                            watchdog.run(ffmpegcmd, check=True, timeout=120, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
                         if not os.path.exists(image_filename):
                             ffmpegcmd[ffmpegcmd.index('-ss') + 1] = '00:00:05'
-                            subprocess.run(ffmpegcmd, check=True, timeout=120, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                            watchdog.run(ffmpegcmd, check=True, timeout=120, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
                         if not os.path.exists(image_filename):
                             raise FileNotFoundError(f"Cover image not created: {image_filename}")
                         with open(image_filename, "rb") as img:
-                            encoded = base64.b64encode(img.read()).decode()
-                        update_cover(scene_id, "data:image/jpg;base64," + encoded)
+                            encoded = base64.b64encode(img.read()).decode('ascii')
+                        _upload_pool.submit(_upload_cover, scene_id, filename_pretty, "data:image/jpg;base64," + encoded)
                         performed_options.append("cover")
                         if config.debug:
                             cover_elapsed = time.time() - cover_start
@@ -144,19 +277,32 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                         log_scene_failure(scene_id, filename_pretty, "cover image generation", e)
                         tag_scene_error(scene_id, cover_error_tag, str(e))
                     finally:
-                        shutil.rmtree(temp_dir, ignore_errors=True)
+                        scratch.cleanup()
         except Exception as e:
             log_scene_failure(scene_id, filename_pretty, "cover image setup", e)
             tag_scene_error(scene_id, cover_error_tag, str(e))
 
+        if phash_proc is not None:
+            try:
+                phash = _collect_phash(phash_proc, phash_reader, phash_output)
+                update_phash(file_id, phash)
+                performed_options.append("phash")
+                if config.debug:
+                    phash_elapsed = time.time() - phash_start
+                    print(f"🟡 [DEBUG] Finished phash generation for {filename_pretty} in {phash_elapsed:.2f} seconds")
+            except Exception as e:
+                log_scene_failure(scene_id, filename_pretty, "hashing", e)
+                tag_scene_error(scene_id, hashing_error_tag, str(e))
+                success = False
+
         if config.generate_sprite:
-            sprite_file = os.path.join(sprite_path, f"{filehash}_sprite.jpg")
-            vtt_file = os.path.join(sprite_path, f"{filehash}_thumbs.vtt")
             encoder_note = "VAAPI" if vaapi_supported else "software"
-            if not os.path.exists(sprite_file):
+            if "sprite" in fused:
+                performed_options.append("sprite")
+            elif not os.path.exists(sprite_file):
                 if config.debug:
                     print(f"🟡 [DEBUG] Starting sprite generation for {filename_pretty}")
-                    print(f"🟡 [DEBUG] VideoSpriteGenerator: 81 frames × {encoder_note} extraction → PIL assembly → {sprite_file}")
+                    print(f"🟡 [DEBUG] VideoSpriteGenerator: 81 frames × {encoder_note} fps/tile pass → {sprite_file}")
                     sprite_start = time.time()
                 if config.dry_run:
                     print(f"[DRY RUN] Would generate sprite for {filename_pretty} → {sprite_file}")
@@ -169,14 +315,15 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                         if not config.debug:
                             sprite_start = time.time()
                         generator = VideoSpriteGenerator(
-                            filename, sprite_file, vtt_file, filehash, ffmpeg, ffprobe,
-                            use_vaapi=vaapi_supported, vaapi_device=vaapi_device
+                            filename, sprite_file, vtt_file, ffmpeg, ffprobe,
+                            use_vaapi=hw_decode, vaapi_device=vaapi_device,
+                            duration=scene['files'][0].get('duration')
                         )
                         generator.generate_sprite()
                         sprite_elapsed = time.time() - sprite_start
                         performed_options.append("sprite")
                         if config.verbose:
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Sprite generation complete for {filename_pretty} in {sprite_elapsed:.2f} seconds.")
+                            print(f"[{_ts()}] ✅ Sprite generation complete for {filename_pretty} in {sprite_elapsed:.2f} seconds.")
                     except Exception as e:
                         log_scene_failure(scene_id, filename_pretty, "sprite generation", e)
                         tag_scene_error(scene_id, hashing_error_tag, str(e))
@@ -184,8 +331,10 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                         # Don't return early - continue to release scene
 
         if config.generate_preview:
-            preview_file = os.path.join(preview_path, f"{filehash}.mp4")
-            if not os.path.exists(preview_file):
+            if "preview" in fused:
+                vaapi_used = vaapi_supported
+                performed_options.append("preview (vaapi)" if vaapi_supported else "preview")
+            elif not os.path.exists(preview_file):
                 if config.debug:
                     print(f"🟡 [DEBUG] Starting preview generation for {filename_pretty}")
                     preview_start = time.time()
@@ -207,14 +356,16 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                             preview_clips=preview_clips, clip_length=preview_clip_length,
                             skip_seconds=preview_skip_seconds, include_audio=preview_audio,
                             scene_id=scene_id, scene_name=filename_pretty,
-                            use_vaapi=vaapi_supported, vaapi_device=vaapi_device
+                            use_vaapi=vaapi_supported, vaapi_device=vaapi_device,
+                            duration=scene['files'][0].get('duration'), hw_decode=hw_decode,
+                            audio_codec=scene['files'][0].get('audio_codec')
                         )
                         generator.generate_preview()
                         preview_elapsed = time.time() - preview_start
                         if not vaapi_used:
                             performed_options.append("preview")
                         if config.verbose:
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Preview generation complete for {filename_pretty} in {preview_elapsed:.2f} seconds.")
+                            print(f"[{_ts()}] ✅ Preview generation complete for {filename_pretty} in {preview_elapsed:.2f} seconds.")
                     except Exception as e:
                         log_scene_failure(scene_id, filename_pretty, "preview generation", e)
                         tag_scene_error(scene_id, hashing_error_tag, str(e))
@@ -232,7 +383,7 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
 
                     if markers:
                         if config.verbose:
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🎯 Found {len(markers)} markers for scene {scene_id}")
+                            print(f"[{_ts()}] 🎯 Found {len(markers)} markers for scene {scene_id}")
 
                         for marker in markers:
                             marker_id = marker['id']
@@ -255,16 +406,17 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
                                         thumbnail_duration=config.marker_thumbnail_duration,
                                         thumbnail_fps=config.marker_thumbnail_fps,
                                         use_vaapi=vaapi_supported,
-                                        vaapi_device=vaapi_device
+                                        vaapi_device=vaapi_device,
+                                        hw_decode=hw_decode
                                     )
 
                                     result = generator.generate_marker()
 
                                     if result['success']:
-                                        files_str = ', '.join([os.path.basename(f) for f in result['files']])
                                         performed_options.append(f"marker {marker_id}")
                                         if config.verbose:
-                                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Marker {marker_title} generated: {files_str}")
+                                            files_str = ', '.join([os.path.basename(f) for f in result['files']])
+                                            print(f"[{_ts()}] ✅ Marker {marker_title} generated: {files_str}")
                                     else:
                                         log_marker_failure(marker_id, marker_title, "marker generation",
                                                          result.get('error', 'Unknown error'))
@@ -277,12 +429,18 @@ def process_scene(scene, index=None, total_batch=None, vaapi_supported=False, va
 
         end_time = time.time()
         elapsed = end_time - start_time
-        options_str = ', '.join(performed_options) if performed_options else 'none'
-        vaapi_note = " (VAAPI used)" if vaapi_used else ""
         if config.verbose and success:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Processed scene file '{filename_pretty}' in {elapsed:.2f} seconds. Options performed: {options_str}{vaapi_note}")
+            options_str = ', '.join(performed_options) if performed_options else 'none'
+            vaapi_note = " (VAAPI used)" if vaapi_used else ""
+            print(f"[{_ts()}] ✅ Processed scene file '{filename_pretty}' in {elapsed:.2f} seconds. Options performed: {options_str}{vaapi_note}")
 
         return {'success': success, 'elapsed_time': elapsed, 'scene_id': scene_id}
 
     finally:
+        if phash_proc is not None and phash_proc.poll() is None:
+            phash_proc.kill()
+            phash_proc.wait()
+        if scratch is not None:
+            scratch.cleanup()
+        watchdog.scene_finished()
         release_scene(scene_id)
@@ -2,17 +2,11 @@
 
 import os
 from helpers.stash_utils import stash
+from helpers.path_utils import translate_path
 import config
 
 _PAGE_SIZE = 100
 
-def translate_path(docker_path):
-    """Translate Stash/Docker paths to local paths using config.translations"""
-    for t in config.translations:
-        if docker_path.startswith(t['orig']):
-            return docker_path.replace(t['orig'], t['local'], 1)
-    return docker_path
-
 def discover_missing_sprites(limit=None):
     """
     Discover scenes that are missing sprite sheets for standalone generation.
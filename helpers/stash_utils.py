@@ -3,6 +3,7 @@
 from stashapi.stashapp import StashInterface
 from config import hashing_tag, hashing_error_tag, cover_error_tag, dry_run, stash_scheme, stash_host, stash_port, stash_api_key, excluded_paths, error_log_path, error_log_max_mb
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 import os
 import threading
 
@@ -19,6 +20,13 @@ if stash_api_key:
 
 stash = StashInterface(stash_config)
 
+# StashInterface reuses one keep-alive session; widen its connection pool (default 10)
+# so concurrent worker threads don't discard and re-open connections to Stash
+stash.s.mount(f"{stash_scheme}://", HTTPAdapter(pool_connections=1, pool_maxsize=32))
+
+# Scenes per bulkSceneUpdate when clearing tags in bulk
+BULK_UPDATE_CHUNK = 100
+
 # Thread-safe error logging
 error_log_lock = threading.Lock()
 
@@ -85,12 +93,29 @@ def get_total_scene_count():
         )
         return count
 
+def update_scenes_batch(*updates_input):
+    """
+    Apply several bulkSceneUpdate inputs in a single GraphQL request.
+
+    Each input becomes an aliased mutation field; GraphQL runs mutation fields
+    in order, so this behaves like consecutive update_scenes() calls with one
+    round-trip instead of one per input.
+    """
+    if len(updates_input) == 1:
+        return stash.update_scenes(updates_input[0])
+    params = ", ".join(f"$u{i}: BulkSceneUpdateInput!" for i in range(len(updates_input)))
+    fields = " ".join(f"u{i}: bulkSceneUpdate(input: $u{i}) {{ id }}" for i in range(len(updates_input)))
+    variables = {f"u{i}": update for i, update in enumerate(updates_input)}
+    return stash.call_GQL(f"mutation BulkSceneUpdates({params}) {{ {fields} }}", variables)
+
 def tag_scene_error(scene_id, error_tag, error_msg=None):
     if dry_run:
         print(f"[DRY RUN] Would tag scene {scene_id} with error tag {error_tag}")
         return
-    stash.update_scenes({"ids": [scene_id], "tag_ids": {"ids": error_tag, "mode": "ADD"}})
-    stash.update_scenes({"ids": [scene_id], "tag_ids": {"ids": hashing_tag, "mode": "REMOVE"}})
+    update_scenes_batch(
+        {"ids": [scene_id], "tag_ids": {"ids": error_tag, "mode": "ADD"}},
+        {"ids": [scene_id], "tag_ids": {"ids": hashing_tag, "mode": "REMOVE"}}
+    )
     if error_msg:
         # Thread-safe error logging
         try:
@@ -131,17 +156,21 @@ def get_error_scenes():
     return stash.find_scenes(
         f={"tags": {"value": [hashing_error_tag, cover_error_tag], "modifier": "INCLUDES"}},
         filter={"sort": "created_at", "direction": "DESC", "per_page": -1},
-        fragment="id files{id path fingerprints{value type}} paths{screenshot}"
+        fragment="id files{id path duration video_codec audio_codec fingerprints{value type}} paths{screenshot}"
     )
 
+def _id_chunks(scene_ids):
+    """Split scene IDs into bulkSceneUpdate-sized chunks"""
+    scene_ids = list(scene_ids)
+    return [scene_ids[i:i + BULK_UPDATE_CHUNK] for i in range(0, len(scene_ids), BULK_UPDATE_CHUNK)]
+
 def clear_error_tags(scene_ids):
     """Clear error tags from scenes"""
     if dry_run:
         print(f"[DRY RUN] Would clear error tags from {len(scene_ids)} scenes")
         return
-    for scene_id in scene_ids:
-        stash.update_scenes({"ids": [scene_id], "tag_ids": {"ids": hashing_error_tag, "mode": "REMOVE"}})
-        stash.update_scenes({"ids": [scene_id], "tag_ids": {"ids": cover_error_tag, "mode": "REMOVE"}})
+    for chunk in _id_chunks(scene_ids):
+        stash.update_scenes({"ids": chunk, "tag_ids": {"ids": [hashing_error_tag, cover_error_tag], "mode": "REMOVE"}})
 
 def get_hashing_scenes():
     """Get scenes currently tagged with the in-process hashing tag"""
@@ -156,8 +185,8 @@ def clear_hashing_tags(scene_ids):
     if dry_run:
         print(f"[DRY RUN] Would clear hashing tag from {len(scene_ids)} scenes")
         return
-    for scene_id in scene_ids:
-        stash.update_scenes({"ids": [scene_id], "tag_ids": {"ids": hashing_tag, "mode": "REMOVE"}})
+    for chunk in _id_chunks(scene_ids):
+        stash.update_scenes({"ids": chunk, "tag_ids": {"ids": hashing_tag, "mode": "REMOVE"}})
 
 def get_scene_markers_with_files(scene_id):
     """
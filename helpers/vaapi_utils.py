@@ -1,7 +1,34 @@
+import os
 import subprocess
+from functools import lru_cache
 
+# vainfo profile name prefix -> ffprobe codec name (as stored in Stash's video_codec)
+VAAPI_PROFILE_CODECS = {
+    "VAProfileMPEG2": "mpeg2video",
+    "VAProfileH264": "h264",
+    "VAProfileMPEG4": "mpeg4",
+    "VAProfileVC1": "vc1",
+    "VAProfileJPEG": "mjpeg",
+    "VAProfileVP8": "vp8",
+    "VAProfileHEVC": "hevc",
+    "VAProfileVP9": "vp9",
+    "VAProfileAV1": "av1",
+}
+
+@lru_cache(maxsize=None)
+def _vainfo(device):
+    """vainfo output for a device (run once per device per process)"""
+    result = subprocess.run(
+        ["vainfo", "--display", "drm", "--device", device],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        timeout=5
+    )
+    return result.stdout.decode("utf-8")
+
+@lru_cache(maxsize=1)
 def vaapi_available():
-    """Check if VAAPI is available on the system."""
+    """Check if VAAPI is available on the system (probed once per process; see refresh())."""
     # Try common VAAPI device paths
     device_paths = [
         "/dev/dri/renderD128",
@@ -9,16 +36,44 @@ def vaapi_available():
         "/dev/dri/card1"
     ]
     for device in device_paths:
+        # Skip the vainfo fork (and its 5s timeout) for nodes that are missing or not ours to open
+        if not os.access(device, os.R_OK | os.W_OK):
+            continue
         try:
-            result = subprocess.run(
-                ["vainfo", "--display", "drm", "--device", device],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                timeout=5
-            )
-            output = result.stdout.decode("utf-8")
+            output = _vainfo(device)
             if "VA-API version" in output and "Driver version" in output:
                 return True, device
         except Exception:
             continue
     return False, None
+
+def vaapi_decode_codecs(device):
+    """
+    Codecs the device can hardware-decode, from the VLD (decode) entrypoints vainfo lists.
+
+    Returns None when vainfo can't be read, in which case callers should assume
+    every codec is supported (the previous behaviour).
+    """
+    try:
+        output = _vainfo(device)
+    except Exception:
+        return None
+    codecs = set()
+    for line in output.splitlines():
+        profile, _, entrypoint = line.partition(":")
+        if "VAEntrypointVLD" not in entrypoint:
+            continue
+        profile = profile.strip()
+        for prefix, codec in VAAPI_PROFILE_CODECS.items():
+            if profile.startswith(prefix):
+                codecs.add(codec)
+    return codecs or None
+
+def can_hw_decode(codec, codecs):
+    """True unless the device's decode codecs are known and `codec` isn't one of them"""
+    return not codecs or not codec or codec.lower() in codecs
+
+def refresh():
+    """Forget the cached vaapi_available() result so the next call probes the devices again."""
+    vaapi_available.cache_clear()
+    _vainfo.cache_clear()
@@ -1,19 +1,16 @@
 # video_sprite_generator.py
 
 import subprocess
-from PIL import Image
 import os
-import shutil
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
-from config import verbose, max_workers
+from config import verbose
+from helpers import probe, watchdog
+from helpers.ffmpeg_utils import thread_args, fail_fast_args
 import time
 from datetime import datetime
 
 class VideoSpriteGenerator:
-    def __init__(self, video_path, sprite_path, vtt_path, filehash, ffmpeg='ffmpeg', ffprobe='ffprobe', total_shots=81, max_width=160, max_height=90, columns=9, rows=9, use_vaapi=None, vaapi_device=None):
+    def __init__(self, video_path, sprite_path, vtt_path, ffmpeg='ffmpeg', ffprobe='ffprobe', total_shots=81, max_width=160, max_height=90, columns=9, rows=9, use_vaapi=None, vaapi_device=None, duration=None):
         self.video_path = os.path.abspath(video_path.strip('"').strip("'"))
-        self.temp_dir = os.path.abspath(os.path.join(".tmp", f"screenshots_{filehash}"))
         self.sprite_path = os.path.abspath(sprite_path)
         self.vtt_path = os.path.abspath(vtt_path)
         self.total_shots = total_shots
@@ -25,64 +22,60 @@ class VideoSpriteGenerator:
         self.ffprobe = ffprobe
         self.use_vaapi = use_vaapi
         self.vaapi_device = vaapi_device
+        self.duration = duration  # Seconds, as reported by Stash; probed when missing
 
     def get_video_duration(self):
-        result = subprocess.run(
-            [self.ffprobe, '-v', 'error', '-show_entries', 'format=duration',
-             '-of', 'default=noprint_wrappers=1:nokey=1', self.video_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        try:
-            return float(result.stdout.strip())
-        except (ValueError, TypeError):
-            stderr = result.stderr.decode('utf-8', errors='replace').strip()
-            raise RuntimeError(f"Could not determine duration for {self.video_path}: {stderr}")
+        if self.duration:
+            return float(self.duration)
+        return probe.get_video_duration(self.video_path, self.ffprobe)
 
     def clean_previous_files(self):
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
         if os.path.exists(self.vtt_path):
             os.remove(self.vtt_path)
 
-    def extract_and_resize(self, i, interval, use_vaapi):
-        time = i * interval
-        output_file = os.path.join(self.temp_dir, f'frame_{i:03d}.jpg')
+    def build_graph(self, duration, use_vaapi, index=0):
+        """Return (input args, filtergraph, output args) for the sprite, reading input `index`"""
+        # fps samples total_shots frames evenly across the file and tile lays them out
+        # row-major, so one decode pass writes the finished sprite — no per-frame files.
+        # Only keyframes are decoded (-skip_frame nokey): each thumbnail is the nearest
+        # preceding keyframe, which keeps long files from a full software decode
+        sample = f'fps={self.total_shots}/{duration}'
+        tile = f'tile={self.columns}x{self.rows}'
+        keyframes = ['-skip_frame', 'nokey']
         if use_vaapi:
-            command = [
-                self.ffmpeg, '-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi',
-                '-vaapi_device', self.vaapi_device,
-                '-v', 'error', '-y',
-                '-ss', str(time), '-i', self.video_path,
-                '-frames:v', '1',
-                '-vf', f'scale_vaapi={self.max_width}:-2,hwdownload,format=bgr0',
-                '-c:v', 'png', output_file,
-                '-loglevel', 'quiet'
-            ]
+            inputs = thread_args() + fail_fast_args() + keyframes + ['-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi', '-i', self.video_path]
+            chain = f'{sample},scale_vaapi={self.max_width}:{self.max_height},hwdownload,format=nv12,{tile}'
         else:
-            command = [
-                self.ffmpeg,
-                '-ss', str(time),
-                '-i', self.video_path,
-                '-frames:v', '1',
-                '-q:v', '2',
-                output_file,
-                '-loglevel', 'quiet'
-            ]
-        try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        except subprocess.CalledProcessError as e:
-            stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
-            detail = stderr[-1] if stderr else str(e)
-            raise RuntimeError(f"ffmpeg failed extracting frame {i}: {detail}")
-        with Image.open(output_file) as img:
-            img = img.resize((self.max_width, self.max_height), Image.Resampling.LANCZOS)
-            img.save(output_file)
-        return (i, time)
+            inputs = thread_args() + fail_fast_args() + keyframes + ['-i', self.video_path]
+            chain = f'{sample},scale={self.max_width}:{self.max_height},{tile}'
+        graph = f'[{index}:v:0]{chain}[sprite]'
+        outputs = ['-map', '[sprite]', '-frames:v', '1', '-q:v', '3'] + thread_args() + [self.sprite_path]
+        return inputs, graph, outputs
+
+    def build_command(self, duration, use_vaapi):
+        inputs, graph, outputs = self.build_graph(duration, use_vaapi)
+        command = [self.ffmpeg, '-v', 'error', '-y']
+        if use_vaapi:
+            command.extend(['-vaapi_device', self.vaapi_device])
+        command.extend(inputs)
+        command.extend(['-filter_complex', graph])
+        command.extend(outputs)
+        return command
+
+    def write_vtt(self, interval):
+        # Tile positions are fixed by the grid, so cue i always maps to cell i
+        sprite_name = os.path.basename(self.sprite_path)
+        size = f"{self.max_width},{self.max_height}"
+        cues = [
+            f"{self.format_time(i * interval)} --> {self.format_time((i + 1) * interval)}\n"
+            f"{sprite_name}#xywh={(i % self.columns) * self.max_width},{(i // self.columns) * self.max_height},{size}\n\n"
+            for i in range(self.total_shots)
+        ]
+        with open(self.vtt_path, 'w') as vtt_file:
+            vtt_file.writelines(["WEBVTT\n\n", *cues])
 
     def take_screenshots(self):
         self.clean_previous_files()
-        os.makedirs(self.temp_dir, exist_ok=True)
         duration = self.get_video_duration()
         if not duration or duration <= 0:
             return False
@@ -90,61 +83,28 @@ class VideoSpriteGenerator:
 
         use_vaapi = bool(self.use_vaapi) and bool(self.vaapi_device)
 
-        with open(self.vtt_path, 'w') as vtt_file:
-            vtt_file.write("WEBVTT\n\n")
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(self.extract_and_resize, i, interval, use_vaapi) for i in range(self.total_shots)]
-                iterator = tqdm(futures, desc="🖼️ Extracting Screenshots", unit="frame") if verbose else futures
-                for future in iterator:
-                    i, time = future.result()
-                    end_time = time + interval
-                    start_time_str = self.format_time(time)
-                    end_time_str = self.format_time(end_time)
-                    x = (i % self.columns) * self.max_width
-                    y = (i // self.columns) * self.max_height
-                    vtt_file.write(f"{start_time_str} --> {end_time_str}\n")
-                    vtt_file.write(f"{os.path.basename(self.sprite_path)}#xywh={x},{y},{self.max_width},{self.max_height}\n\n")
+        command = self.build_command(duration, use_vaapi)
+        try:
+            watchdog.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode('utf-8', errors='replace').strip().splitlines()
+            detail = stderr[-1] if stderr else str(e)
+            raise RuntimeError(f"ffmpeg failed generating sprite: {detail}")
+        self.write_vtt(interval)
         return True
 
     def format_time(self, seconds):
-        millisec = int((seconds % 1) * 1000)
-        seconds = int(seconds)
-        minutes, seconds = divmod(seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        return f"{hours:02}:{minutes:02}:{seconds:02}.{millisec:03}"
-
-    def create_sprite(self):
-        image_files = sorted(
-            f for f in os.listdir(self.temp_dir) if f.lower().endswith('.jpg')
-        )
-        if not image_files:
-            raise ValueError("Something went wrong, no images found to create sprite")
-
-        sprite_width = self.max_width * self.columns
-        sprite_height = self.max_height * self.rows
-        sprite = Image.new('RGB', (sprite_width, sprite_height))
-
-        iterator = tqdm(enumerate(image_files), desc="🧩 Assembling Sprite", unit="tile", total=len(image_files)) if verbose else enumerate(image_files)
-        for idx, fname in iterator:
-            x = (idx % self.columns) * self.max_width
-            y = (idx // self.columns) * self.max_height
-            with Image.open(os.path.join(self.temp_dir, fname)) as img:
-                sprite.paste(img, (x, y))
-
-        sprite.save(self.sprite_path)
-
-    def clean_up(self):
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        ms = int(seconds * 1000)
+        return f"{ms // 3600000:02}:{ms // 60000 % 60:02}:{ms // 1000 % 60:02}.{ms % 1000:03}"
 
     def generate_sprite(self):
-        start = time.time()
-        try:
-            result = self.take_screenshots()
-            if result:
-                self.create_sprite()
-            elapsed = time.time() - start
+        # Nothing to do (and nothing to probe) when a previous run already wrote both files
+        if os.path.exists(self.sprite_path) and os.path.exists(self.vtt_path):
             if verbose:
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Sprite generation complete for {os.path.basename(self.video_path)} in {elapsed:.2f} seconds.")
-        finally:
-            self.clean_up()
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏭️ Sprite and VTT already exist for {os.path.basename(self.video_path)}, skipping.")
+            return
+        start = time.time()
+        self.take_screenshots()
+        elapsed = time.time() - start
+        if verbose:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Sprite generation complete for {os.path.basename(self.video_path)} in {elapsed:.2f} seconds.")
@@ -0,0 +1,80 @@
+# watchdog.py
+
+import subprocess
+import threading
+import time
+
+# Wall-clock budget for one scene, counted from when a worker starts it
+SCENE_TIMEOUT = 600
+CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_active = {}  # worker thread ident -> {'scene_id', 'started', 'procs', 'expired'}
+
+def scene_started(scene_id):
+    """Start the current worker thread's scene clock"""
+    with _lock:
+        _active[threading.get_ident()] = {'scene_id': scene_id, 'started': time.monotonic(), 'procs': set(), 'expired': False}
+
+def scene_finished():
+    with _lock:
+        _active.pop(threading.get_ident(), None)
+
+def track(proc):
+    """Register a child process of the current scene so the watchdog can kill it"""
+    with _lock:
+        entry = _active.get(threading.get_ident())
+        if entry is not None:
+            entry['procs'].add(proc)
+
+def untrack(proc):
+    with _lock:
+        entry = _active.get(threading.get_ident())
+        if entry is not None:
+            entry['procs'].discard(proc)
+
+def expired():
+    """True once the current scene has used up SCENE_TIMEOUT"""
+    with _lock:
+        entry = _active.get(threading.get_ident())
+        return entry is not None and (entry['expired'] or time.monotonic() - entry['started'] > SCENE_TIMEOUT)
+
+def run(command, timeout=None, check=False, **kwargs):
+    """
+    subprocess.run() for scene work: the child is registered with the watchdog,
+    and nothing new is started once the scene is over its time budget.
+    """
+    if expired():
+        raise subprocess.TimeoutExpired(command, SCENE_TIMEOUT)
+    with subprocess.Popen(command, **kwargs) as proc:
+        track(proc)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            untrack(proc)
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+
+def _watch():
+    while True:
+        time.sleep(CHECK_INTERVAL)
+        now = time.monotonic()
+        with _lock:
+            overdue = [entry for entry in _active.values() if now - entry['started'] > SCENE_TIMEOUT]
+            for entry in overdue:
+                if not entry['expired']:
+                    entry['expired'] = True
+                    print(f"⏱️ Scene {entry['scene_id']} exceeded {SCENE_TIMEOUT // 60} minutes; stopping its ffmpeg processes")
+            procs = [proc for entry in overdue for proc in entry['procs']]
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+
+def start():
+    """Launch the watchdog thread (once, from main)"""
+    threading.Thread(target=_watch, name="scene-watchdog", daemon=True).start()
@@ -8,11 +8,10 @@ import threading
 import subprocess
 import signal
 import sys
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, as_completed
 
 import config
-from helpers.scene_discovery import discover_scenes
-from helpers.scene_processor import process_scene
 from helpers.stash_utils import get_total_scene_count, get_error_scenes, clear_error_tags, get_hashing_scenes, clear_hashing_tags, reset_terminal
 from helpers.health_check import run_health_check
 from helpers.statistics import batch_stats
@@ -21,6 +20,25 @@ from helpers.statistics import batch_stats
 shutdown_requested = False
 shutdown_event = threading.Event()
 
+# Resolved by a watcher thread once shutdown is requested; the batch loop waits on it
+# alongside the scene futures so a signal cancels queued scenes right away instead of
+# at the next scene completion (by which time the executor has started another one)
+shutdown_future = Future()
+
+def watch_shutdown():
+    shutdown_event.wait()
+    shutdown_future.set_result(None)
+
+# The database total is only shown in the batch header, so refresh it at most once a minute
+TOTAL_COUNT_TTL = 60
+_total_cache = {'value': None, 'ts': 0.0}
+
+def cached_total_scene_count():
+    now = time.monotonic()
+    if _total_cache['value'] is None or now - _total_cache['ts'] > TOTAL_COUNT_TTL:
+        _total_cache.update(value=get_total_scene_count(), ts=now)
+    return _total_cache['value']
+
 def apply_cli_args(args):
     config.windows = args.windows
     if args.generate_sprite:
@@ -38,6 +56,14 @@ def apply_cli_args(args):
         config.per_page = args.batch_size
     if args.max_workers:
         config.max_workers = args.max_workers
+    if args.ffmpeg_threads_per_invocation is not None:
+        if not 1 <= args.ffmpeg_threads_per_invocation <= 64:
+            print(f"❌ --ffmpeg-threads-per-invocation must be between 1 and 64 (got {args.ffmpeg_threads_per_invocation})")
+            sys.exit(1)
+        config.ffmpeg_threads = args.ffmpeg_threads_per_invocation
+    if not getattr(config, 'ffmpeg_threads', 0):
+        # Share the CPU between the concurrent workers' ffmpeg processes
+        config.ffmpeg_threads = max(1, (os.cpu_count() or config.max_workers) // config.max_workers)
     if args.batch_sleep is not None:
         config.batch_sleep = args.batch_sleep
     if args.filemask:
@@ -79,31 +105,34 @@ def signal_handler(signum, frame):
     shutdown_requested = True
     shutdown_event.set()
 
+# The startup sweep runs in the background; an early exit path must not rmtree alongside it
+tmp_lock = threading.Lock()
+
 def clean_temp_dirs(recreate=True):
     tmp_dir = os.path.join(os.getcwd(), ".tmp")
 
-    # Remove entire .tmp directory if it exists
-    if os.path.exists(tmp_dir):
-        try:
-            shutil.rmtree(tmp_dir)
-            if config.verbose:
-                print(f"🧹 Cleaned temporary directory: .tmp")
-        except Exception as e:
-            if config.verbose:
-                print(f"⚠️ Failed to remove .tmp: {e}")
-
-    # Create fresh .tmp directory (unless we're exiting)
-    if recreate:
-        try:
-            os.makedirs(tmp_dir, exist_ok=True)
-        except Exception as e:
-            if config.verbose:
-                print(f"⚠️ Failed to create .tmp: {e}")
+    with tmp_lock:
+        # Remove entire .tmp directory if it exists
+        if os.path.exists(tmp_dir):
+            try:
+                shutil.rmtree(tmp_dir)
+                if config.verbose:
+                    print(f"🧹 Cleaned temporary directory: .tmp")
+            except Exception as e:
+                if config.verbose:
+                    print(f"⚠️ Failed to remove .tmp: {e}")
+
+        # Create fresh .tmp directory (unless we're exiting)
+        if recreate:
+            try:
+                os.makedirs(tmp_dir, exist_ok=True)
+            except Exception as e:
+                if config.verbose:
+                    print(f"⚠️ Failed to create .tmp: {e}")
 
 def process_sprite(scene_data, index, total, vaapi_supported, vaapi_device):
     """Process a single sprite for standalone mode."""
     import time
-    from datetime import datetime
     from helpers.video_sprite_generator import VideoSpriteGenerator
     from helpers.stash_utils import log_scene_failure
 
@@ -120,9 +149,10 @@ def process_sprite(scene_data, index, total, vaapi_supported, vaapi_device):
 
     try:
         generator = VideoSpriteGenerator(
-            scene_data['video_path'], sprite_file, vtt_file, oshash,
+            scene_data['video_path'], sprite_file, vtt_file,
             config.ffmpeg, config.ffprobe,
-            use_vaapi=vaapi_supported, vaapi_device=vaapi_device
+            use_vaapi=vaapi_supported, vaapi_device=vaapi_device,
+            duration=scene_data.get('duration')
         )
         generator.generate_sprite()
         elapsed = time.time() - start_time
@@ -139,7 +169,6 @@ def process_sprite(scene_data, index, total, vaapi_supported, vaapi_device):
 def process_preview(scene_data, index, total, vaapi_supported, vaapi_device):
     """Process a single preview for standalone mode."""
     import time
-    from datetime import datetime
     from helpers.preview_video_generator import PreviewVideoGenerator
     from helpers.stash_utils import log_scene_failure
 
@@ -162,7 +191,9 @@ def process_preview(scene_data, index, total, vaapi_supported, vaapi_device):
             skip_seconds=config.preview_skip_seconds,
             include_audio=config.preview_audio,
             scene_id=scene_id, scene_name=scene_title,
-            use_vaapi=vaapi_supported, vaapi_device=vaapi_device
+            use_vaapi=vaapi_supported, vaapi_device=vaapi_device,
+            duration=scene_data.get('duration'),
+            audio_codec=scene_data.get('audio_codec')
         )
         generator.generate_preview()
         elapsed = time.time() - start_time
@@ -179,7 +210,6 @@ def process_preview(scene_data, index, total, vaapi_supported, vaapi_device):
 def process_marker(marker_data, index, total, vaapi_supported, vaapi_device):
     """Process a single marker for standalone mode."""
     import time
-    from datetime import datetime
     from helpers.marker_generator import MarkerGenerator
     from helpers.stash_utils import log_marker_failure
 
@@ -211,8 +241,8 @@ def process_marker(marker_data, index, total, vaapi_supported, vaapi_device):
         elapsed = time.time() - start_time
 
         if result['success']:
-            files_str = ', '.join([os.path.basename(f) for f in result['files']])
             if config.verbose:
+                files_str = ', '.join([os.path.basename(f) for f in result['files']])
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Generated {files_str} in {elapsed:.2f}s")
             return {'success': True, 'elapsed_time': elapsed, 'marker_id': marker_id}
         else:
@@ -269,6 +299,7 @@ Other useful options:
     basic.add_argument("--windows", action="store_true", help="Use Windows-style paths and binaries")
     basic.add_argument("--batch-size", type=int, help="Number of scenes to process per run (default: 25)")
     basic.add_argument("--max-workers", type=int, help="Number of threads for parallel processing (default: 4)")
+    basic.add_argument("--ffmpeg-threads-per-invocation", type=int, help="Threads per ffmpeg process, 1-64 (default: CPU cores / max workers)")
     basic.add_argument("--batch-sleep", type=int, help="Seconds to wait between batches (default: 5, 0 = no delay)")
     basic.add_argument("--dry-run", action="store_true", help="Simulate processing without writing changes")
     basic.add_argument("--verbose", action="store_true", help="Enable detailed output and progress bars")
@@ -317,36 +348,37 @@ Other useful options:
     # Register signal handlers for graceful shutdown
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
+    threading.Thread(target=watch_shutdown, name="shutdown-watcher", daemon=True).start()
 
     # Hardware encoder resolution (evaluated once at startup)
-    from datetime import datetime
-    from helpers.vaapi_utils import vaapi_available
+    from helpers.vaapi_utils import vaapi_available, vaapi_decode_codecs
 
     # Step 1: Auto-detect VAAPI
     vaapi_supported, vaapi_device = vaapi_available() if not config.windows else (False, None)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # One timestamp for the whole encoder report
 
     # Step 2: Apply CLI overrides — highest precedence
     vaapi_override = getattr(config, 'vaapi_override', None)
     if vaapi_override is True:
         vaapi_supported = True
         if config.verbose:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 VAAPI forced ON via --vaapi.")
+            print(f"[{timestamp}] 🚀 VAAPI forced ON via --vaapi.")
     elif vaapi_override is False:
         vaapi_supported = False
         vaapi_device = None
         if config.verbose:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 VAAPI forced OFF via --novaapi.")
+            print(f"[{timestamp}] 🚀 VAAPI forced OFF via --novaapi.")
     elif not config.vaapi:
         # VAAPI disabled in config, no CLI override present
         vaapi_supported = False
         vaapi_device = None
         if config.verbose:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 VAAPI disabled in config.")
+            print(f"[{timestamp}] 🚀 VAAPI disabled in config.")
     elif config.verbose:
         if vaapi_supported:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 VAAPI detected on {vaapi_device}.")
+            print(f"[{timestamp}] 🚀 VAAPI detected on {vaapi_device}.")
         else:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 VAAPI not available.")
+            print(f"[{timestamp}] 🚀 VAAPI not available.")
 
     # Default device path if VAAPI was forced on but detection returned no device
     if vaapi_supported and vaapi_device is None:
@@ -357,7 +389,7 @@ Other useful options:
         vaapi_supported = False
         vaapi_device = None
         if config.verbose:
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 NVENC takes priority over VAAPI (hw_priority=nvenc).")
+            print(f"[{timestamp}] 🚀 NVENC takes priority over VAAPI (hw_priority=nvenc).")
 
     # Report final encoder selection
     if config.verbose:
@@ -367,7 +399,12 @@ Other useful options:
             encoder = "NVENC"
         else:
             encoder = "software (libx264)"
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🎬 Hardware encoder: {encoder}")
+        print(f"[{timestamp}] 🎬 Hardware encoder: {encoder}")
+
+    # Codecs the GPU can decode; scenes in other codecs decode in software and still encode on VAAPI
+    config.vaapi_codecs = vaapi_decode_codecs(vaapi_device) if vaapi_supported else None
+    if config.verbose and config.vaapi_codecs:
+        print(f"[{timestamp}] 🎬 VAAPI decode: {', '.join(sorted(config.vaapi_codecs))}")
 
     # Handle special CLI commands
     if args.health_check:
@@ -405,18 +442,24 @@ Other useful options:
             print("❌ Health checks failed. Aborting. Use --health-check to diagnose.")
             sys.exit(1)
 
+    # Sweep anything a previous (crashed) run left in .tmp; scenes clean up their own
+    # scratch directories, so this only runs at startup and exit. It runs in the
+    # background so it overlaps the first discovery query.
+    startup_sweep = threading.Thread(target=clean_temp_dirs, name="tmp-sweep")
+    startup_sweep.start()
+
     # Standalone generation modes (process and exit, don't enter main loop)
     standalone_mode = args.standalone_sprites or args.standalone_previews or args.standalone_markers
 
     if standalone_mode:
         from tqdm import tqdm
+        startup_sweep.join()
 
         while True:
             if shutdown_requested:
                 print("🛑 Shutdown requested. Exiting...")
                 break
 
-            clean_temp_dirs()
             work_found = False
 
             # Standalone sprite generation
@@ -580,21 +623,34 @@ Other useful options:
         reset_terminal()
         sys.exit(0)
 
+    # Imported here so the utility commands and standalone modes don't load the scene
+    # pipeline (and the numpy/scipy/PIL stack behind the internal phash backend)
+    from helpers.scene_discovery import discover_scenes
+    from helpers.scene_processor import process_scene
+    from helpers import watchdog
+    watchdog.start()
+    if config.verbose:
+        from tqdm import tqdm
+
+    # One worker pool for the whole run; scenes still running past a batch deadline keep
+    # their worker and the next batch queues behind them
+    executor = ThreadPoolExecutor(max_workers=config.max_workers, thread_name_prefix="scene")
+
     while True:
         if shutdown_requested:
             print("🛑 Shutdown requested. Exiting...")
+            executor.shutdown(cancel_futures=True)
             clean_temp_dirs(recreate=False)
             reset_terminal()
             break
 
-        clean_temp_dirs()
-
         # Get scenes to process (retry errors or normal discovery)
         if args.retry_errors:
             print("🔄 Fetching scenes with error tags for retry...")
             scenes = get_error_scenes()
             if not scenes:
                 print("✅ No error scenes to retry. Exiting.")
+                executor.shutdown(cancel_futures=True)
                 clean_temp_dirs(recreate=False)
                 reset_terminal()
                 break
@@ -607,50 +663,70 @@ Other useful options:
         if not scenes:
             print("✅ No scenes to process. Exiting.")
             print("🧹 Cleaning up temporary directories...")
+            executor.shutdown(cancel_futures=True)
             clean_temp_dirs(recreate=False)
             reset_terminal()
             break
 
         total_batch = len(scenes)
-        total_database = get_total_scene_count()
+        total_database = cached_total_scene_count()
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🎯 Selected page with {total_batch} scenes (out of {total_database} total)")
 
         # Initialize statistics tracking
         batch_stats.start_batch(total_batch)
 
-        executor = None
+        # Scenes create their scratch directories under .tmp, so the sweep must be done
+        startup_sweep.join()
+
         try:
-            executor = ThreadPoolExecutor(max_workers=config.max_workers)
-            futures = []
+            futures = {}  # future -> scene ID, to name the scene in worker errors and timeouts
             for index, scene in enumerate(scenes, start=1):
-                futures.append(executor.submit(process_scene, scene, index, total_batch, vaapi_supported, vaapi_device))
+                futures[executor.submit(process_scene, scene, index, total_batch, vaapi_supported, vaapi_device)] = scene['id']
+
+            # Reap scenes in completion order so a slow scene doesn't hold up the ones
+            # finishing after it. The watchdog stops a scene's ffmpeg work 10 minutes after
+            # it starts; the batch deadline (10 minutes per "wave" of max_workers scenes)
+            # only backs that up, e.g. for a scene stuck on a Stash request.
+            batch_timeout = 600 * -(-len(futures) // config.max_workers)
+            completed = as_completed([*futures, shutdown_future], timeout=batch_timeout)
 
             # Progress bar for batch completion
             if config.verbose:
-                from tqdm import tqdm
                 print()  # Blank line before progress bar
-                iterator = tqdm(futures, desc="📦 Processing Batch", unit="scene", total=len(futures),
+                iterator = tqdm(completed, desc="📦 Processing Batch", unit="scene", total=len(futures),
                                leave=True, dynamic_ncols=True, position=0)
             else:
-                iterator = futures
+                iterator = completed
 
-            for future in iterator:
-                if shutdown_requested:
-                    print("\n🛑 Shutdown requested. Cancelling remaining scenes...")
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    break
+            try:
+                reaped = 0
+                for future in iterator:
+                    if shutdown_requested:
+                        print("\n🛑 Shutdown requested. Cancelling remaining scenes...")
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        break
 
-                try:
-                    result = future.result(timeout=600)  # 10 minute timeout per scene
-                    if result and result.get('success'):
-                        batch_stats.record_success(result.get('elapsed_time'))
-                    else:
+                    try:
+                        result = future.result()
+                        if result and result.get('success'):
+                            batch_stats.record_success(result.get('elapsed_time'))
+                        else:
+                            batch_stats.record_failure()
+                    except Exception as e:
+                        print(f"⚠️ Worker thread error (scene {futures[future]}): {e}")
                         batch_stats.record_failure()
-                except TimeoutError:
-                    print(f"⚠️ Scene processing timed out after 10 minutes")
-                    batch_stats.record_failure()
-                except Exception as e:
-                    print(f"⚠️ Worker thread error: {e}")
+
+                    # as_completed() would otherwise keep waiting on shutdown_future
+                    # until the batch deadline
+                    reaped += 1
+                    if reaped == len(futures):
+                        if config.verbose:
+                            iterator.close()
+                        break
+            except TimeoutError:
+                unfinished = [scene_id for f, scene_id in futures.items() if not f.done()]
+                print(f"⚠️ {len(unfinished)} scene(s) still running after the {batch_timeout // 60}-minute batch deadline: {', '.join(unfinished)}")
+                for _ in unfinished:
                     batch_stats.record_failure()
 
             # Print statistics summary
@@ -658,19 +734,16 @@ Other useful options:
 
         except KeyboardInterrupt:
             print("\n🛑 Interrupted by user. Shutting down gracefully...")
-            if executor:
-                executor.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=False, cancel_futures=True)
             print("🧹 Cleaning up temporary directories...")
             clean_temp_dirs(recreate=False)
             reset_terminal()
             break
-        finally:
-            if executor:
-                executor.shutdown(wait=True)
 
         if config.once:
             print("✅ Finished single batch. Exiting due to --once flag.")
             print("🧹 Cleaning up temporary directories...")
+            executor.shutdown(cancel_futures=True)
             clean_temp_dirs(recreate=False)
             reset_terminal()
             break
@@ -678,7 +751,14 @@ Other useful options:
         if config.batch_sleep > 0:
             print(f"⏳ Waiting {config.batch_sleep}s before next batch... Press Ctrl+C to cancel.")
             if shutdown_event.wait(timeout=config.batch_sleep):
+                print("🛑 Shutdown requested. Exiting...")
+                executor.shutdown(cancel_futures=True)
+                clean_temp_dirs(recreate=False)
+                reset_terminal()
                 break
 
+    # Let in-flight scenes finish (and release their claim tags) before exiting
+    executor.shutdown(cancel_futures=True)
+
 if __name__ == '__main__':
     main()